@@ -4,25 +4,236 @@
 import random
 import time
 import math
-from BaseAI import BaseAI
+import json
+import csv
+import os
+import argparse
+import multiprocessing
+import mmap
+import struct
+import gc
+import bisect
+from array import array
+
+# The game framework is only needed to play. Without it the agent, tuning, n-tuple, book and stats code still
+# imports and runs on any grid object, and Grid is imported by the functions that create grids
+try:
+    from BaseAI import BaseAI
+except ImportError:
+    BaseAI = object
+
+# Weights of the heuristic terms, in the order they are summed in heuristic()
+HEURISTIC_TERMS = ("similarity", "merges", "largest_corner_tile_value", "ordering", "available_cells", "max_tile")
+DEFAULT_WEIGHTS = {"similarity": 2, "merges": 4, "largest_corner_tile_value": 2, "ordering": 3, "available_cells": 6, "max_tile": 1}
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "2048_weights.json")
+NTUPLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "2048_ntuple.bin")
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "2048_book.bin")
+
+# Read the agent config file, an empty config if it is missing or unreadable
+def load_config(filename=WEIGHTS_FILE):
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# Load heuristic weights from the config file, falling back to the defaults for anything missing
+def load_weights(filename=WEIGHTS_FILE):
+    weights = dict(DEFAULT_WEIGHTS)
+    for term, weight in load_config(filename).get("weights", {}).items():
+        if term in weights:
+            weights[term] = float(weight)
+
+    return weights
+
+# Set entries of the config file, keeping any other settings already in it
+def update_config(filename=WEIGHTS_FILE, **settings):
+    config = load_config(filename)
+    config.update(settings)
+    write_json(filename, config)
+
+# Write heuristic weights to the config file
+def save_weights(weights, filename=WEIGHTS_FILE, fitness=None):
+    settings = {"weights": {term: weights[term] for term in HEURISTIC_TERMS}}
+    if fitness is not None:
+        settings["fitness"] = fitness
+
+    update_config(filename, **settings)
+
+# Write a json file atomically so a killed run never leaves a truncated file behind
+def write_json(filename, data):
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_filename, filename)
 
 class IntelligentAgent(BaseAI):
-    def __init__(self):
+    def __init__(self, weights=None, evaluator=None, stats=None):
         self.time_limit = 0.2 
         self.start_time = None
         self.depth_limit = 3 
+        self.weights = load_weights() if weights is None else dict(weights)
+        config = load_config()
+
+        # Any object with an evaluate(grid) method can replace the handcrafted heuristic
+        if evaluator is None:
+            if config.get("evaluator") == "ntuple":
+                evaluator = NTupleNetwork.load(config.get("ntuple_file", NTUPLE_FILE))
+        self.evaluator = evaluator
+
+        # Move ordering: best move found per position, and how often each move won at each depth
+        self.transposition_table = {}
+        self.transposition_table_limit = 1 << 18
+        self.history = [[0] * 4 for _ in range(self.depth_limit + 1)]
+        self.max_nodes_ordered = 0
+        self.first_move_best = 0
+
+        # In-place search makes and unmakes moves and spawns on the grid passed to getMove instead of cloning it
+        self.in_place = True
+        self.pause_gc = True
+        self.undo_stack = []
+        self.move_lines = {}
+
+        # Opening book of precomputed best moves for low tile sum positions. Without the fallback,
+        # a book miss inside the book's range is answered by a depth 1 search instead of a full one
+        self.opening_book = None
+        if config.get("opening_book") and os.path.exists(config["opening_book"]):
+            self.opening_book = OpeningBook.load(config["opening_book"])
+        self.book_fallback = config.get("book_fallback", True)
+        self.book_hits = 0
+        self.book_misses = 0
+
+        # Optional SearchStats recording every move. None keeps the search down to one None check per node
+        self.stats = stats
 
     def getMove(self, grid):
+        if self.stats is None:
+            return self.choose_move(grid)
+
+        self.stats.begin_move(self)
+        move = self.choose_move(grid)
+        self.stats.end_move(self, move)
+        return move
+
+    def choose_move(self, grid):
         self.start_time = time.time()
-        return self.expectiminimax(grid, "human", float("-inf"), float("inf"), self.depth_limit)[0]
+
+        if self.opening_book is not None and grid.size == 4 and self.opening_book.covers(grid):
+            move = self.opening_book.lookup(grid)
+            if move is not None:
+                self.book_hits += 1
+                return move
+
+            self.book_misses += 1
+            if not self.book_fallback:
+                return max(grid.getAvailableMoves(), key=lambda item: self.evaluate(item[1]))[0]
+
+        if len(self.transposition_table) > self.transposition_table_limit:
+            self.transposition_table.clear()
+        if len(self.history) <= self.depth_limit:
+            self.history += [[0] * 4 for _ in range(self.depth_limit + 1 - len(self.history))]
+
+        # The search creates no reference cycles, so the collector only adds pauses while it runs
+        gc_enabled = gc.isenabled()
+        if self.pause_gc:
+            gc.disable()
+        try:
+            if self.in_place:
+                return self.expectiminimax_in_place(grid, "human", float("-inf"), float("inf"), self.depth_limit)[0]
+            return self.expectiminimax(grid, "human", float("-inf"), float("inf"), self.depth_limit)[0]
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    # Fraction of max nodes with more than one move where the first move tried was the best one
+    def first_move_best_rate(self):
+        if self.max_nodes_ordered == 0:
+            return 0.0
+        return self.first_move_best / self.max_nodes_ordered
+
+    # Order moves by transposition table best move, then history score at this depth, then empty cells after the move
+    def order_moves(self, grid, moves, depth):
+        tt_move = self.transposition_table.get(tuple(cell for row in grid.map for cell in row))
+        history = self.history[depth]
+
+        def key(item):
+            move, new_grid = item
+            return (move == tt_move, history[move], sum(row.count(0) for row in new_grid.map))
+
+        moves.sort(key=key, reverse=True)
+        return moves
+
+    # Cells of each line in the order tiles slide for a move (0 up, 1 down, 2 left, 3 right), cached per board size
+    def get_move_lines(self, n, move):
+        lines = self.move_lines.get((n, move))
+        if lines is None:
+            if move == 0:
+                lines = [[(i, k) for i in range(n)] for k in range(n)]
+            elif move == 1:
+                lines = [[(n - 1 - i, k) for i in range(n)] for k in range(n)]
+            elif move == 2:
+                lines = [[(k, i) for i in range(n)] for k in range(n)]
+            else:
+                lines = [[(k, n - 1 - i) for i in range(n)] for k in range(n)]
+            self.move_lines[(n, move)] = lines
+        return lines
+
+    # Slide the grid in place, saving its cells on the undo stack. Returns False, with nothing saved, if nothing moved
+    def make_move(self, grid, move):
+        board = grid.map
+        stack = self.undo_stack
+        for row in board:
+            stack.extend(row)
+
+        moved = False
+        for line in self.get_move_lines(grid.size, move):
+            write = 0
+            last = 0
+            for row, col in line:
+                value = board[row][col]
+                if value == 0:
+                    continue
+                board[row][col] = 0
+
+                if value == last:
+                    target_row, target_col = line[write - 1]
+                    board[target_row][target_col] = value * 2
+                    last = 0
+                    moved = True
+                else:
+                    target_row, target_col = line[write]
+                    board[target_row][target_col] = value
+                    last = value
+                    write += 1
+                    if target_row != row or target_col != col:
+                        moved = True
+
+        if not moved:
+            self.unmake_move(grid)
+        return moved
+
+    # Restore the cells saved by the last make_move
+    def unmake_move(self, grid):
+        board = grid.map
+        stack = self.undo_stack
+        for row in reversed(board):
+            for col in range(len(row) - 1, -1, -1):
+                row[col] = stack.pop()
+
+    # Score a leaf with the plugged-in evaluator, or the handcrafted heuristic if there is none
+    def evaluate(self, grid):
+        if self.evaluator is None:
+            return self.heuristic(grid)
+        return self.evaluator.evaluate(grid)
     
     def heuristic(self, grid):
-        score = (2 * self.similarity(grid) + 
-                4 * self.merges(grid) +
-                2 * self.largest_corner_tile_value(grid) + 
-                3 * self.ordering(grid) + 
-                6 * len(grid.getAvailableCells()) +
-                1 * grid.getMaxTile())
+        weights = self.weights
+        score = (weights["similarity"] * self.similarity(grid) + 
+                weights["merges"] * self.merges(grid) +
+                weights["largest_corner_tile_value"] * self.largest_corner_tile_value(grid) + 
+                weights["ordering"] * self.ordering(grid) + 
+                weights["available_cells"] * len(grid.getAvailableCells()) +
+                weights["max_tile"] * grid.getMaxTile())
 
         return score
     
@@ -143,14 +354,27 @@ class IntelligentAgent(BaseAI):
 
 
     def expectiminimax(self, grid, player, alpha, beta, depth):
+        stats = self.stats
+        if stats is not None:
+            stats.node(self.depth_limit - depth)
+
         # Terminal State
         if time.time() - self.start_time > self.time_limit or depth == 0 or not grid.canMove():
-            return -1, self.heuristic(grid)
+            if stats is not None:
+                return -1, stats.leaf(self, grid, depth)
+            return -1, self.evaluate(grid)
             
         # Human Player
         if player == "human":
             max_utility = float("-inf")
-            for move, new_grid in grid.getAvailableMoves():
+            if stats is None:
+                available_moves = grid.getAvailableMoves()
+            else:
+                start = time.perf_counter_ns()
+                available_moves = grid.getAvailableMoves()
+                stats.available_moves_ns += time.perf_counter_ns() - start
+            moves = self.order_moves(grid, available_moves, depth)
+            for move, new_grid in moves:
                 utility = self.expectiminimax(new_grid, "AI", alpha, beta, depth - 1)[1]
 
                 if utility > max_utility:
@@ -161,7 +385,16 @@ class IntelligentAgent(BaseAI):
                     alpha = max_utility
                 
                 if max_utility >= beta:
+                    if stats is not None:
+                        stats.cutoffs += 1
                     break
+
+            self.transposition_table[tuple(cell for row in grid.map for cell in row)] = max_child
+            self.history[depth][max_child] += depth * depth
+            if len(moves) > 1:
+                self.max_nodes_ordered += 1
+                if max_child == moves[0][0]:
+                    self.first_move_best += 1
             
             return max_child, max_utility
         
@@ -171,7 +404,12 @@ class IntelligentAgent(BaseAI):
             min_utility = float("inf")
             for cell in grid.getAvailableCells():
                 for tile, probability in [(2, 0.9), (4, 0.1)]:
-                    new_grid = grid.clone()
+                    if stats is None:
+                        new_grid = grid.clone()
+                    else:
+                        start = time.perf_counter_ns()
+                        new_grid = grid.clone()
+                        stats.clone_ns += time.perf_counter_ns() - start
                     new_grid.setCellValue(cell, tile)
 
                     utility = self.expectiminimax(new_grid, "human", alpha, beta, depth - 1)[1]
@@ -184,10 +422,686 @@ class IntelligentAgent(BaseAI):
                         beta = min_utility
                     
                     if min_utility <= alpha:
+                        if stats is not None:
+                            stats.cutoffs += 1
                         break
             
             return -1, min_utility
 
+    # Same search as expectiminimax, on one mutable grid that is restored exactly before returning
+    def expectiminimax_in_place(self, grid, player, alpha, beta, depth):
+        stats = self.stats
+        if stats is not None:
+            stats.node(self.depth_limit - depth)
+
+        # Terminal State
+        if time.time() - self.start_time > self.time_limit or depth == 0 or not grid.canMove():
+            if stats is not None:
+                return -1, stats.leaf(self, grid, depth)
+            return -1, self.evaluate(grid)
+
+        # Human Player
+        if player == "human":
+            key = tuple(cell for row in grid.map for cell in row)
+            tt_move = self.transposition_table.get(key)
+            history = self.history[depth]
+
+            if stats is not None:
+                start = time.perf_counter_ns()
+            moves = []
+            for move in range(4):
+                if self.make_move(grid, move):
+                    empty_cells = sum(row.count(0) for row in grid.map)
+                    self.unmake_move(grid)
+                    moves.append((move == tt_move, history[move], empty_cells, move))
+            if stats is not None:
+                stats.available_moves_ns += time.perf_counter_ns() - start
+            moves.sort(key=lambda item: item[:3], reverse=True)
+
+            max_utility = float("-inf")
+            for _, _, _, move in moves:
+                self.make_move(grid, move)
+                utility = self.expectiminimax_in_place(grid, "AI", alpha, beta, depth - 1)[1]
+                self.unmake_move(grid)
+
+                if utility > max_utility:
+                    max_child = move
+                    max_utility = utility
+
+                if max_utility > alpha:
+                    alpha = max_utility
+
+                if max_utility >= beta:
+                    if stats is not None:
+                        stats.cutoffs += 1
+                    break
+
+            self.transposition_table[key] = max_child
+            history[max_child] += depth * depth
+            if len(moves) > 1:
+                self.max_nodes_ordered += 1
+                if max_child == moves[0][3]:
+                    self.first_move_best += 1
+
+            return max_child, max_utility
+
+        # AI
+        elif player == "AI":
+            board = grid.map
+            expected_utility = 0
+            min_utility = float("inf")
+            for row, col in grid.getAvailableCells():
+                for tile, probability in [(2, 0.9), (4, 0.1)]:
+                    board[row][col] = tile
+                    utility = self.expectiminimax_in_place(grid, "human", alpha, beta, depth - 1)[1]
+                    board[row][col] = 0
+                    expected_utility += (probability * utility)
+
+                    if expected_utility < min_utility:
+                        min_utility = expected_utility
+
+                    if min_utility < beta:
+                        beta = min_utility
+
+                    if min_utility <= alpha:
+                        if stats is not None:
+                            stats.cutoffs += 1
+                        break
+
+            return -1, min_utility
+
+
+# Per-move search statistics of an IntelligentAgent: nodes per ply, cutoffs, time limit aborts and the
+# perf_counter_ns spent generating moves (getAvailableMoves, or make/unmake in the in-place search),
+# cloning grids and evaluating leaves, and how often move ordering tried the best move first.
+# Finished moves are kept as records and written out with dump
+class SearchStats:
+    PHASES = ("available_moves_ns", "clone_ns", "heuristic_ns")
+
+    def __init__(self):
+        self.records = []
+        self.game = None
+        self.game_moves = 0
+        self.reset()
+
+    # Clear the counters of the move in progress
+    def reset(self):
+        self.nodes_per_depth = []
+        self.cutoffs = 0
+        self.time_aborts = 0
+        self.available_moves_ns = 0
+        self.clone_ns = 0
+        self.heuristic_ns = 0
+
+    # Start numbering moves of a new game, identified by its seed
+    def new_game(self, game):
+        self.game = game
+        self.game_moves = 0
+
+    def begin_move(self, agent):
+        self.reset()
+        self.book_hits = agent.book_hits
+        self.max_nodes_ordered = agent.max_nodes_ordered
+        self.first_move_best = agent.first_move_best
+        self.move_start = time.perf_counter_ns()
+
+    def end_move(self, agent, move):
+        self.records.append({
+            "game": self.game,
+            "move": self.game_moves,
+            "chosen": move,
+            "book": agent.book_hits > self.book_hits,
+            "time_ns": time.perf_counter_ns() - self.move_start,
+            "nodes": sum(self.nodes_per_depth),
+            "max_depth": len(self.nodes_per_depth) - 1,
+            "cutoffs": self.cutoffs,
+            "time_aborts": self.time_aborts,
+            "max_nodes_ordered": agent.max_nodes_ordered - self.max_nodes_ordered,
+            "first_move_best": agent.first_move_best - self.first_move_best,
+            "available_moves_ns": self.available_moves_ns,
+            "clone_ns": self.clone_ns,
+            "heuristic_ns": self.heuristic_ns,
+            "nodes_per_depth": self.nodes_per_depth,
+        })
+        self.game_moves += 1
+
+    # Count a node visited at the given ply from the root
+    def node(self, ply):
+        nodes_per_depth = self.nodes_per_depth
+        if ply >= len(nodes_per_depth):
+            nodes_per_depth.extend([0] * (ply + 1 - len(nodes_per_depth)))
+        nodes_per_depth[ply] += 1
+
+    # Evaluate a leaf for the agent, timing the evaluation and counting leaves cut short by the time limit
+    def leaf(self, agent, grid, depth):
+        if depth > 0 and time.time() - agent.start_time > agent.time_limit:
+            self.time_aborts += 1
+        start = time.perf_counter_ns()
+        value = agent.evaluate(grid)
+        self.heuristic_ns += time.perf_counter_ns() - start
+        return value
+
+    # Totals over all recorded moves
+    def summary(self):
+        totals = {"moves": len(self.records)}
+        for key in ("nodes", "cutoffs", "time_aborts", "max_nodes_ordered", "first_move_best", "time_ns") + self.PHASES:
+            totals[key] = sum(record[key] for record in self.records)
+        totals["first_move_best_rate"] = totals["first_move_best"] / totals["max_nodes_ordered"] if totals["max_nodes_ordered"] else 0.0
+        totals["max_depth"] = max((record["max_depth"] for record in self.records), default=-1)
+        return totals
+
+    # Write one row per move, as CSV for a .csv filename (nodes per depth spread over depth_<ply> columns) or JSONL otherwise
+    def dump(self, filename):
+        if not filename.endswith(".csv"):
+            with open(filename, "w") as f:
+                for record in self.records:
+                    f.write(json.dumps(record) + "\n")
+            return
+
+        depths = max((len(record["nodes_per_depth"]) for record in self.records), default=0)
+        fields = [key for key in self.records[0] if key != "nodes_per_depth"] if self.records else []
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(fields + ["depth_{:d}".format(ply) for ply in range(depths)])
+            for record in self.records:
+                counts = record["nodes_per_depth"]
+                writer.writerow([record[key] for key in fields] + counts + [0] * (depths - len(counts)))
+
+
+# Default tuples, as cell indices of the row-major 4x4 board: two straight lines and two 2x3 rectangles
+DEFAULT_TUPLES = ((0, 1, 2, 3), (4, 5, 6, 7), (0, 1, 2, 4, 5, 6), (4, 5, 6, 8, 9, 10))
+NTUPLE_MAGIC = b"NTUP"
+
+# Cell mapped through one of the 8 rotations/reflections of the 4x4 board
+def symmetric_cell(cell, symmetry):
+    row, col = divmod(cell, 4)
+    for _ in range(symmetry % 4):
+        row, col = col, 3 - row
+    if symmetry >= 4:
+        col = 3 - col
+    return row * 4 + col
+
+# Board as a flat list of 16 tile exponents (0 for empty, 1 for 2, 2 for 4, ...), capped at 15
+def grid_to_cells(grid):
+    cells = []
+    for row in grid.map:
+        for value in row:
+            cells.append(min(value.bit_length() - 1, 15) if value > 0 else 0)
+    return cells
+
+class NTupleNetwork:
+    # Each tuple owns one flat float32 table with 16 ** len(tuple) entries, shared by its 8 symmetric copies
+    def __init__(self, tuples=DEFAULT_TUPLES, tables=None):
+        self.tuples = [tuple(t) for t in tuples]
+        self.patterns = [[[symmetric_cell(cell, symmetry) for cell in t] for symmetry in range(8)] for t in self.tuples]
+        self.lookups = 8 * len(self.tuples)
+        self.mmap = None
+
+        if tables is None:
+            tables = [array("f", [0.0]) * (16 ** len(t)) for t in self.tuples]
+        self.tables = tables
+
+    # Memory map a saved network read-only, or copy it into writable arrays for further training
+    @classmethod
+    def load(cls, filename, writable=False):
+        with open(filename, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if data[:4] != NTUPLE_MAGIC:
+            data.close()
+            raise ValueError("Not an n-tuple network file: " + filename)
+
+        count = struct.unpack_from("<I", data, 4)[0]
+        offset = 8
+        tuples = []
+        for _ in range(count):
+            length = struct.unpack_from("<I", data, offset)[0]
+            tuples.append(struct.unpack_from("<{:d}I".format(length), data, offset + 4))
+            offset += 4 + 4 * length
+
+        tables = []
+        for t in tuples:
+            size = 4 * 16 ** len(t)
+            if writable:
+                table = array("f")
+                table.frombytes(data[offset:offset + size])
+            else:
+                table = memoryview(data)[offset:offset + size].cast("f")
+            tables.append(table)
+            offset += size
+
+        network = cls(tuples, tables)
+        if writable:
+            data.close()
+        else:
+            network.mmap = data
+        return network
+
+    def save(self, filename):
+        temp_filename = filename + ".tmp"
+        with open(temp_filename, "wb") as f:
+            f.write(NTUPLE_MAGIC)
+            f.write(struct.pack("<I", len(self.tuples)))
+            for t in self.tuples:
+                f.write(struct.pack("<{:d}I".format(len(t) + 1), len(t), *t))
+            for table in self.tables:
+                f.write(table.tobytes() if isinstance(table, array) else bytes(table))
+        os.replace(temp_filename, filename)
+
+    def evaluate(self, grid):
+        return self.evaluate_cells(grid_to_cells(grid))
+
+    def evaluate_cells(self, cells):
+        total = 0.0
+        for table, patterns in zip(self.tables, self.patterns):
+            for pattern in patterns:
+                index = 0
+                for cell in pattern:
+                    index = (index << 4) | cells[cell]
+                total += table[index]
+        return total
+
+    # Spread a TD error evenly over every table entry that contributed to the value of cells
+    def update(self, cells, delta):
+        delta /= self.lookups
+        for table, patterns in zip(self.tables, self.patterns):
+            for pattern in patterns:
+                index = 0
+                for cell in pattern:
+                    index = (index << 4) | cells[cell]
+                table[index] += delta
+
+# Cells of each line in the order tiles slide, indexed by move (0 up, 1 down, 2 left, 3 right as in Grid)
+MOVE_LINES = ([[col, 4 + col, 8 + col, 12 + col] for col in range(4)],
+              [[12 + col, 8 + col, 4 + col, col] for col in range(4)],
+              [[4 * row, 4 * row + 1, 4 * row + 2, 4 * row + 3] for row in range(4)],
+              [[4 * row + 3, 4 * row + 2, 4 * row + 1, 4 * row] for row in range(4)])
+
+# Result and merge reward of sliding every possible line of four exponents towards its first cell
+def build_line_table():
+    line_table = []
+    for key in range(16 ** 4):
+        tiles = [(key >> shift) & 15 for shift in (12, 8, 4, 0)]
+        tiles = [tile for tile in tiles if tile > 0]
+        result = []
+        reward = 0
+        i = 0
+        while i < len(tiles):
+            if i + 1 < len(tiles) and tiles[i] == tiles[i + 1]:
+                merged = min(tiles[i] + 1, 15)
+                result.append(merged)
+                reward += 2 ** merged
+                i += 2
+            else:
+                result.append(tiles[i])
+                i += 1
+        result += [0] * (4 - len(result))
+        line_table.append((result, reward))
+    return line_table
+
+# Afterstate and reward of a move on a flat exponent board, None if the move changes nothing
+def slide_cells(cells, move, line_table):
+    after = list(cells)
+    reward = 0
+    moved = False
+    for line in MOVE_LINES[move]:
+        a, b, c, d = line
+        result, line_reward = line_table[(cells[a] << 12) | (cells[b] << 8) | (cells[c] << 4) | cells[d]]
+        for cell, value in zip(line, result):
+            if after[cell] != value:
+                after[cell] = value
+                moved = True
+        reward += line_reward
+
+    if not moved:
+        return None
+    return after, reward
+
+def spawn_cell(cells, rng):
+    empty = [i for i in range(16) if cells[i] == 0]
+    if empty:
+        cells[rng.choice(empty)] = 1 if rng.random() < 0.9 else 2
+
+# TD(0) afterstate learning by greedy self-play, saving the network every save_every games
+def train_ntuple(network, games, alpha, seed, output_file, save_every=1000):
+    rng = random.Random(seed)
+    line_table = build_line_table()
+    start_time = time.time()
+    scores = []
+
+    for game in range(1, games + 1):
+        cells = [0] * 16
+        spawn_cell(cells, rng)
+        spawn_cell(cells, rng)
+        previous = None
+        score = 0
+
+        while True:
+            best_value, best = float("-inf"), None
+            for move in range(4):
+                result = slide_cells(cells, move, line_table)
+                if result is not None:
+                    value = result[1] + network.evaluate_cells(result[0])
+                    if value > best_value:
+                        best_value, best = value, result
+
+            if best is None:
+                if previous is not None:
+                    network.update(previous, alpha * -network.evaluate_cells(previous))
+                break
+
+            after, reward = best
+            if previous is not None:
+                network.update(previous, alpha * (best_value - network.evaluate_cells(previous)))
+
+            score += reward
+            previous = after
+            cells = list(after)
+            spawn_cell(cells, rng)
+
+        scores.append(score)
+        if game % save_every == 0 or game == games:
+            network.save(output_file)
+            recent = scores[-save_every:]
+            print("Game {:d}: mean score {:.1f} over last {:d} games, {:.1f}s elapsed".format(
+                game, sum(recent) / len(recent), len(recent), time.time() - start_time))
+
+    return network
+
+BOOK_MAGIC = b"BOOK"
+
+# Board packed into 64 bits, 4 bits of tile exponent per cell in row-major order
+def pack_cells(cells):
+    key = 0
+    for cell in cells:
+        key = (key << 4) | cell
+    return key
+
+class OpeningBook:
+    # Sorted uint64 board keys with one best move byte per key, binary searched in place
+    def __init__(self, keys, moves, max_sum, data=None):
+        self.keys = keys
+        self.moves = moves
+        self.max_sum = max_sum
+        self.mmap = data
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if data[:4] != BOOK_MAGIC:
+            data.close()
+            raise ValueError("Not an opening book file: " + filename)
+
+        count, max_sum = struct.unpack_from("<II", data, 4)
+        view = memoryview(data)
+        keys = view[12:12 + 8 * count].cast("Q")
+        moves = view[12 + 8 * count:12 + 9 * count]
+        return cls(keys, moves, max_sum, data)
+
+    @staticmethod
+    def save(filename, positions, max_sum):
+        keys = sorted(positions)
+        temp_filename = filename + ".tmp"
+        with open(temp_filename, "wb") as f:
+            f.write(BOOK_MAGIC)
+            f.write(struct.pack("<II", len(keys), max_sum))
+            f.write(array("Q", keys).tobytes())
+            f.write(bytes(positions[key] for key in keys))
+        os.replace(temp_filename, filename)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Whether the position is small enough to have been searched when the book was built
+    def covers(self, grid):
+        return sum(sum(row) for row in grid.map) <= self.max_sum
+
+    def lookup(self, grid):
+        key = pack_cells(grid_to_cells(grid))
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.moves[i]
+        return None
+
+# Positions seen during fast self-play with a tile sum of at most max_sum, as packed keys
+def collect_book_positions(task):
+    seed, max_sum = task
+    agent = IntelligentAgent()
+    agent.opening_book = None
+    agent.depth_limit = 1
+    agent.time_limit = float("inf")
+
+    from Grid import Grid
+
+    rng = random.Random(seed)
+    grid = Grid()
+    spawn_tile(grid, rng)
+    spawn_tile(grid, rng)
+
+    positions = set()
+    while grid.canMove() and sum(sum(row) for row in grid.map) <= max_sum:
+        positions.add(pack_cells(grid_to_cells(grid)))
+        if not grid.move(agent.getMove(grid.clone())):
+            break
+        spawn_tile(grid, rng)
+
+    return positions
+
+# Best move of one packed position found by a deep search without a time limit
+def search_book_position(task):
+    from Grid import Grid
+
+    key, depth = task
+    grid = Grid()
+    for i in range(16):
+        exponent = (key >> (4 * (15 - i))) & 15
+        grid.map[i // 4][i % 4] = 2 ** exponent if exponent else 0
+
+    agent = IntelligentAgent()
+    agent.opening_book = None
+    agent.depth_limit = depth
+    agent.time_limit = float("inf")
+    return key, agent.getMove(grid)
+
+# Build the opening book from positions reached in self-play over the given seeds
+def build_book(seeds, max_sum, depth, processes, output_file):
+    start_time = time.time()
+    with multiprocessing.Pool(processes) as pool:
+        positions = set()
+        for game_positions in pool.map(collect_book_positions, [(seed, max_sum) for seed in seeds]):
+            positions |= game_positions
+        print("Collected {:d} positions in {:.1f}s".format(len(positions), time.time() - start_time))
+
+        book = {}
+        tasks = [(key, depth) for key in positions]
+        for key, move in pool.imap_unordered(search_book_position, tasks, chunksize=16):
+            book[key] = move
+            if len(book) % 1000 == 0:
+                print("Searched {:d}/{:d} positions, {:.1f}s elapsed".format(len(book), len(tasks), time.time() - start_time))
+
+    OpeningBook.save(output_file, book, max_sum)
+    return book
+
+# Place a random tile the same way the game's computer player does
+def spawn_tile(grid, rng):
+    cells = grid.getAvailableCells()
+    if cells:
+        grid.setCellValue(rng.choice(cells), 2 if rng.random() < 0.9 else 4)
+
+# Play one full game with the agent, with all tile spawns drawn from the given seed
+def play_game(agent, seed, max_moves=None):
+    from Grid import Grid
+
+    rng = random.Random(seed)
+    if agent.stats is not None:
+        agent.stats.new_game(seed)
+    grid = Grid()
+    spawn_tile(grid, rng)
+    spawn_tile(grid, rng)
+
+    moves = 0
+    while grid.canMove() and (max_moves is None or moves < max_moves):
+        move = agent.getMove(grid.clone())
+        if move is None or move == -1 or not grid.move(move):
+            break
+
+        spawn_tile(grid, rng)
+        moves += 1
+
+    return grid
+
+# Self-play score of one weight vector on one seed, the sum of the tiles left on the board
+def evaluate_game(task):
+    weights, seed, depth = task
+    agent = IntelligentAgent(weights)
+    # Book moves were searched with the weights of the config file, not the ones being scored, and an n-tuple
+    # evaluator from the config file would ignore those weights altogether
+    agent.opening_book = None
+    agent.evaluator = None
+    agent.depth_limit = depth
+    agent.time_limit = float("inf")
+
+    grid = play_game(agent, seed)
+    return sum(sum(row) for row in grid.map)
+
+# Evolve heuristic weights with the cross-entropy method, checkpointing after every generation
+def tune(generations, population, seeds, depth, processes, checkpoint_file, output_file, sigma=1.0, resume=False):
+    state = None
+    if resume and os.path.exists(checkpoint_file):
+        with open(checkpoint_file) as f:
+            state = json.load(f)
+        print("Resuming from generation {:d}".format(state["generation"]))
+
+    if state is None:
+        state = {"generation": 0,
+                 "mean": [DEFAULT_WEIGHTS[term] for term in HEURISTIC_TERMS],
+                 "sigma": [sigma] * len(HEURISTIC_TERMS),
+                 "best_weights": None,
+                 "best_fitness": None}
+
+    elite_count = max(1, population // 4)
+    with multiprocessing.Pool(processes) as pool:
+        while state["generation"] < generations:
+            # Seeding by generation keeps a resumed run identical to an uninterrupted one
+            rng = random.Random(state["generation"])
+            candidates = []
+            for _ in range(population):
+                candidates.append([m + s * rng.gauss(0, 1) for m, s in zip(state["mean"], state["sigma"])])
+
+            tasks = []
+            for candidate in candidates:
+                weights = dict(zip(HEURISTIC_TERMS, candidate))
+                for seed in seeds:
+                    tasks.append((weights, seed, depth))
+            scores = pool.map(evaluate_game, tasks)
+
+            fitnesses = []
+            for i in range(population):
+                games = scores[i * len(seeds):(i + 1) * len(seeds)]
+                fitnesses.append(sum(games) / len(games))
+
+            ranked = sorted(range(population), key=lambda i: fitnesses[i], reverse=True)
+            elites = [candidates[i] for i in ranked[:elite_count]]
+
+            for k in range(len(HEURISTIC_TERMS)):
+                values = [elite[k] for elite in elites]
+                mean = sum(values) / len(values)
+                variance = sum((value - mean) ** 2 for value in values) / len(values)
+                state["mean"][k] = mean
+                state["sigma"][k] = max(math.sqrt(variance), 0.05)
+
+            best = ranked[0]
+            if state["best_fitness"] is None or fitnesses[best] > state["best_fitness"]:
+                state["best_fitness"] = fitnesses[best]
+                state["best_weights"] = dict(zip(HEURISTIC_TERMS, candidates[best]))
+                save_weights(state["best_weights"], output_file, state["best_fitness"])
+
+            state["generation"] += 1
+            write_json(checkpoint_file, state)
+            print("Generation {:d}: best {:.1f}, mean {:.1f}, overall best {:.1f}".format(
+                state["generation"], fitnesses[best], sum(fitnesses) / population, state["best_fitness"]))
+
+    return state["best_weights"], state["best_fitness"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="2048 IntelligentAgent offline tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    tune_parser = subparsers.add_parser("tune", help="Tune the heuristic weights with parallel self-play")
+    tune_parser.add_argument("--generations", type=int, default=20, help="Number of generations to run")
+    tune_parser.add_argument("--population", type=int, default=16, help="Weight vectors per generation")
+    tune_parser.add_argument("--games", type=int, default=8, help="Self-play games per weight vector")
+    tune_parser.add_argument("--seed", type=int, default=0, help="First seed of the fixed seed set")
+    tune_parser.add_argument("--depth", type=int, default=1, help="Search depth used during self-play")
+    tune_parser.add_argument("--sigma", type=float, default=1.0, help="Initial standard deviation of each weight")
+    tune_parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: all cores)")
+    tune_parser.add_argument("--checkpoint", default="2048_tune_checkpoint.json", help="Checkpoint filename")
+    tune_parser.add_argument("--output", default=WEIGHTS_FILE, help="Weights config filename")
+    tune_parser.add_argument("--resume", action="store_true", default=False, help="Resume from the checkpoint")
+
+    train_parser = subparsers.add_parser("train-ntuple", help="Train an n-tuple network evaluator with TD(0) self-play")
+    train_parser.add_argument("--games", type=int, default=10000, help="Number of self-play games")
+    train_parser.add_argument("--alpha", type=float, default=0.1, help="Learning rate")
+    train_parser.add_argument("--seed", type=int, default=0, help="Seed for tile spawns")
+    train_parser.add_argument("--save-every", type=int, default=1000, help="Games between saves")
+    train_parser.add_argument("--output", default=NTUPLE_FILE, help="Network filename")
+    train_parser.add_argument("--resume", action="store_true", default=False, help="Continue training the saved network")
+
+    book_parser = subparsers.add_parser("build-book", help="Build the opening book with deep offline searches")
+    book_parser.add_argument("--games", type=int, default=1000, help="Self-play games to collect positions from")
+    book_parser.add_argument("--seed", type=int, default=0, help="First seed of the self-play games")
+    book_parser.add_argument("--max-sum", type=int, default=64, help="Largest tile sum of a book position")
+    book_parser.add_argument("--depth", type=int, default=5, help="Search depth for book moves")
+    book_parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: all cores)")
+    book_parser.add_argument("--output", default=BOOK_FILE, help="Opening book filename")
+
+    profile_parser = subparsers.add_parser("profile", help="Play games with search statistics and dump them per move")
+    profile_parser.add_argument("--games", type=int, default=1, help="Number of games")
+    profile_parser.add_argument("--seed", type=int, default=0, help="First seed of the games")
+    profile_parser.add_argument("--depth", type=int, default=3, help="Search depth limit")
+    profile_parser.add_argument("--time-limit", type=float, default=0.2, help="Seconds per move")
+    profile_parser.add_argument("--max-moves", type=int, default=None, help="Stop each game after this many moves")
+    profile_parser.add_argument("--output", default="2048_profile.jsonl", help="Statistics filename, CSV if it ends in .csv, JSONL otherwise")
+
+    args = parser.parse_args()
+
+    if args.command == "tune":
+        seeds = list(range(args.seed, args.seed + args.games))
+        best_weights, best_fitness = tune(args.generations, args.population, seeds, args.depth, args.processes,
+                                          args.checkpoint, args.output, args.sigma, args.resume)
+        print("Best weights: " + json.dumps(best_weights))
+        print("Best fitness: {:.1f}".format(best_fitness))
+
+    if args.command == "train-ntuple":
+        if args.resume and os.path.exists(args.output):
+            network = NTupleNetwork.load(args.output, writable=True)
+        else:
+            network = NTupleNetwork()
+        train_ntuple(network, args.games, args.alpha, args.seed, args.output, args.save_every)
 
+    if args.command == "build-book":
+        book = build_book(range(args.seed, args.seed + args.games), args.max_sum, args.depth, args.processes, args.output)
+        update_config(WEIGHTS_FILE, opening_book=os.path.abspath(args.output))
+        print("Wrote {:d} positions to {}".format(len(book), args.output))
 
+    if args.command == "profile":
+        stats = SearchStats()
+        agent = IntelligentAgent(stats=stats)
+        agent.depth_limit = args.depth
+        agent.time_limit = args.time_limit
+        for seed in range(args.seed, args.seed + args.games):
+            grid = play_game(agent, seed, args.max_moves)
+            print("Game {:d}: max tile {:d}".format(seed, grid.getMaxTile()))
+        stats.dump(args.output)
 
+        summary = stats.summary()
+        print("Moves: {:d}, nodes: {:d}, deepest ply: {:d}, cutoffs: {:d}, time limit aborts: {:d}".format(
+            summary["moves"], summary["nodes"], summary["max_depth"], summary["cutoffs"], summary["time_aborts"]))
+        print("Best move tried first: {:.1%} of {:d} max nodes with more than one move".format(
+            summary["first_move_best_rate"], summary["max_nodes_ordered"]))
+        for phase in ("time_ns",) + SearchStats.PHASES:
+            print("{}: {:.1f} ms".format(phase[:-3], summary[phase] / 1e6))
+        print("Wrote {:d} moves to {}".format(summary["moves"], args.output))
@@ -0,0 +1,323 @@
+"""
+A small pure-Python CDCL SAT solver.
+
+Variables are numbered from 1 and clauses are given as lists of non-zero
+ints in DIMACS style, e.g. [1, -3] means (x1 or not x3).
+
+Internally the literal for variable v is 2v when positive and 2v+1 when
+negative, so the negation of a literal is lit ^ 1.
+
+The solver uses two watched literals for unit propagation, first-UIP
+conflict analysis with clause learning and non-chronological
+backjumping, VSIDS decisions with phase saving, and Luby restarts.
+"""
+import heapq
+
+TRUE = 1
+FALSE = 0
+UNASSIGNED = -1
+
+
+def luby(i):
+    '''
+    Returns the i-th element (from 1) of the Luby sequence 1 1 2 1 1 2 4 1 1 2 ...
+    '''
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while i != (1 << k) - 1:
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+    return 1 << (k - 1)
+
+
+class CDCLSolver:
+    '''
+    Class to represent a SAT instance together with the state of the search on it
+    '''
+
+    def __init__(self, restart_base=100):
+        self.num_vars = 0
+        self.clauses = []
+        self.watches = [[], []]
+        self.values = [UNASSIGNED, UNASSIGNED]
+        self.level = [0]
+        self.reason = [None]
+        self.activity = [0.0]
+        self.phase = [False]
+        self.trail = []
+        self.trail_limits = []
+        self.queue_head = 0
+        self.heap = []
+        self.increment = 1.0
+        self.restart_base = restart_base
+        self.unsatisfiable = False
+        self.stats = {"decisions": 0, "conflicts": 0, "propagations": 0, "learned": 0, "restarts": 0}
+
+    def new_var(self):
+        '''
+        Adds a variable and returns its number
+        '''
+        self.num_vars += 1
+        self.watches += [[], []]
+        self.values += [UNASSIGNED, UNASSIGNED]
+        self.level.append(0)
+        self.reason.append(None)
+        self.activity.append(0.0)
+        self.phase.append(False)
+        heapq.heappush(self.heap, (0.0, self.num_vars))
+        return self.num_vars
+
+    def add_clause(self, clause):
+        '''
+        Adds a clause of DIMACS literals before solving.
+        Returns False if the instance is already known to be unsatisfiable
+        '''
+        if self.unsatisfiable:
+            return False
+
+        literals = []
+        for literal in clause:
+            lit = 2 * literal if literal > 0 else -2 * literal + 1
+            value = self.values[lit]
+            if value == TRUE or lit ^ 1 in literals:
+                return True
+            if value == UNASSIGNED and lit not in literals:
+                literals.append(lit)
+
+        if not literals:
+            self.unsatisfiable = True
+            return False
+
+        if len(literals) == 1:
+            self.enqueue(literals[0], None)
+            if self.propagate() is not None:
+                self.unsatisfiable = True
+                return False
+            return True
+
+        self.attach(literals)
+        return True
+
+    def attach(self, literals):
+        '''
+        Stores a clause of internal literals and watches its first two literals
+        '''
+        index = len(self.clauses)
+        self.clauses.append(literals)
+        self.watches[literals[0]].append(index)
+        self.watches[literals[1]].append(index)
+        return index
+
+    def enqueue(self, lit, reason):
+        '''
+        Makes lit true at the current decision level
+        '''
+        var = lit >> 1
+        self.values[lit] = TRUE
+        self.values[lit ^ 1] = FALSE
+        self.level[var] = len(self.trail_limits)
+        self.reason[var] = reason
+        self.trail.append(lit)
+
+    def propagate(self):
+        '''
+        Runs unit propagation over the watched literals.
+        Returns the index of a conflicting clause, or None
+        '''
+        values = self.values
+        clauses = self.clauses
+        watches = self.watches
+        trail = self.trail
+
+        while self.queue_head < len(trail):
+            false_lit = trail[self.queue_head] ^ 1
+            self.queue_head += 1
+            self.stats["propagations"] += 1
+
+            watchers = watches[false_lit]
+            i = j = 0
+            while i < len(watchers):
+                index = watchers[i]
+                i += 1
+                clause = clauses[index]
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+
+                first = clause[0]
+                if values[first] == TRUE:
+                    watchers[j] = index
+                    j += 1
+                    continue
+
+                for k in range(2, len(clause)):
+                    if values[clause[k]] != FALSE:
+                        clause[1], clause[k] = clause[k], false_lit
+                        watches[clause[1]].append(index)
+                        break
+                else:
+                    watchers[j] = index
+                    j += 1
+                    if values[first] == FALSE:
+                        while i < len(watchers):
+                            watchers[j] = watchers[i]
+                            i += 1
+                            j += 1
+                        del watchers[j:]
+                        return index
+                    self.enqueue(first, index)
+
+            del watchers[j:]
+
+        return None
+
+    def bump(self, var):
+        '''
+        Raises the VSIDS activity of a variable seen in a conflict
+        '''
+        self.activity[var] += self.increment
+        if self.activity[var] > 1e100:
+            for v in range(1, self.num_vars + 1):
+                self.activity[v] *= 1e-100
+            self.increment *= 1e-100
+            self.heap = [(-self.activity[v], v) for v in range(1, self.num_vars + 1) if self.values[2 * v] == UNASSIGNED]
+            heapq.heapify(self.heap)
+        elif self.values[2 * var] == UNASSIGNED:
+            heapq.heappush(self.heap, (-self.activity[var], var))
+
+    def analyze(self, conflict):
+        '''
+        First-UIP conflict analysis.
+        Returns the learned clause, asserting literal first, and the level to backjump to
+        '''
+        level = self.level
+        current_level = len(self.trail_limits)
+        seen = set()
+        learned = [None]
+        counter = 0
+        lit = None
+        index = len(self.trail) - 1
+        clause = self.clauses[conflict]
+
+        while True:
+            for q in (clause if lit is None else clause[1:]):
+                var = q >> 1
+                if var not in seen and level[var] > 0:
+                    seen.add(var)
+                    self.bump(var)
+                    if level[var] >= current_level:
+                        counter += 1
+                    else:
+                        learned.append(q)
+
+            while (self.trail[index] >> 1) not in seen:
+                index -= 1
+            lit = self.trail[index]
+            index -= 1
+            seen.discard(lit >> 1)
+            counter -= 1
+            if counter == 0:
+                break
+            clause = self.clauses[self.reason[lit >> 1]]
+
+        learned[0] = lit ^ 1
+        backjump_level = 0
+        if len(learned) > 1:
+            best = max(range(1, len(learned)), key=lambda k: level[learned[k] >> 1])
+            learned[1], learned[best] = learned[best], learned[1]
+            backjump_level = level[learned[1] >> 1]
+
+        self.increment /= 0.95
+        return learned, backjump_level
+
+    def backjump(self, target_level):
+        '''
+        Undoes every assignment above target_level, saving phases and returning variables to the heap
+        '''
+        if len(self.trail_limits) <= target_level:
+            return
+
+        limit = self.trail_limits[target_level]
+        for lit in self.trail[limit:]:
+            var = lit >> 1
+            self.phase[var] = not (lit & 1)
+            self.values[lit] = UNASSIGNED
+            self.values[lit ^ 1] = UNASSIGNED
+            self.reason[var] = None
+            heapq.heappush(self.heap, (-self.activity[var], var))
+
+        del self.trail[limit:]
+        del self.trail_limits[target_level:]
+        self.queue_head = len(self.trail)
+
+    def decide(self):
+        '''
+        Returns the unassigned variable with the highest activity, or None if all are assigned
+        '''
+        heap = self.heap
+        while heap:
+            activity, var = heapq.heappop(heap)
+            if self.values[2 * var] == UNASSIGNED and -activity == self.activity[var]:
+                return var
+        return None
+
+    def solve(self, max_conflicts=None):
+        '''
+        Searches for a satisfying assignment.
+        Returns True if one is found, False if the instance is unsatisfiable,
+        or None if max_conflicts was reached first
+        '''
+        if self.unsatisfiable:
+            return False
+        if self.propagate() is not None:
+            self.unsatisfiable = True
+            return False
+
+        restart = 1
+        restart_conflicts = self.restart_base * luby(restart)
+        conflicts_since_restart = 0
+
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.stats["conflicts"] += 1
+                conflicts_since_restart += 1
+                if not self.trail_limits:
+                    self.unsatisfiable = True
+                    return False
+                if max_conflicts is not None and self.stats["conflicts"] >= max_conflicts:
+                    self.backjump(0)
+                    return None
+
+                learned, backjump_level = self.analyze(conflict)
+                self.backjump(backjump_level)
+                if len(learned) == 1:
+                    self.enqueue(learned[0], None)
+                else:
+                    self.enqueue(learned[0], self.attach(learned))
+                    self.stats["learned"] += 1
+                continue
+
+            if conflicts_since_restart >= restart_conflicts:
+                self.stats["restarts"] += 1
+                restart += 1
+                restart_conflicts = self.restart_base * luby(restart)
+                conflicts_since_restart = 0
+                self.backjump(0)
+                continue
+
+            var = self.decide()
+            if var is None:
+                return True
+
+            self.stats["decisions"] += 1
+            self.trail_limits.append(len(self.trail))
+            self.enqueue(2 * var if self.phase[var] else 2 * var + 1, None)
+
+    def model_value(self, var):
+        '''
+        Returns the value of a variable in the satisfying assignment found by solve()
+        '''
+        return self.values[2 * var] == TRUE
@@ -21,31 +21,279 @@ Empty inequalities in the board are represented as '-'
 
 """
 import sys
+import os
+import json
 
 #======================================================================#
 #*#*#*# Optional: Import any allowed libraries you may need here #*#*#*#
 #======================================================================#
-import numpy as np
+import math
 import time
-from collections import defaultdict
+import heapq
+import random
+from collections import defaultdict, deque, OrderedDict
 #=================================#
 #*#*#*# Your code ends here #*#*#*#
 #=================================#
 
+# argparse, dbm, multiprocessing, socketserver and the SAT solver in cdcl.py are only imported by the
+# code paths that use them, so that a plain solve or a service process starts quickly
+
 ROW = "ABCDEFGHI"
 COL = "123456789"
+FLIPPED_INEQUALITY = {'<': '>', '>': '<'}
+
+# Domains are bitmasks with bit v set when value v is still possible (bit 0 is unused)
+POPCOUNT = [bin(mask).count("1") for mask in range(1 << 10)]
+DOMAIN_VALUES = [[v for v in range(1, 10) if mask >> v & 1] for mask in range(1 << 10)]
+DIGITS = "0123456789"
+CELL_VALUES = {digit: value for value, digit in enumerate(DIGITS)}
+
+# Written in place of the solved string for a board without a solution
+NO_SOLUTION = "No solution"
+
+# Failures allowed before the k-th restart are RESTART_BASE * luby(k), see solve_board
+RESTART_BASE = 100
+
+# Differently configured solvers raced by solve_portfolio, as (name, solve_board options)
+PORTFOLIO = [
+    ("alldiff", {"propagation": "alldiff"}),
+    ("backjumping", {"propagation": "fc", "backjumping_search": True}),
+    ("restarts", {"propagation": "ac3", "value_ordering": "lcv", "restarts": True, "seed": 1}),
+    ("sat", {"engine": "sat"}),
+]
+
+# Everything about a board that depends only on its size, built once per size by get_layout()
+LAYOUTS = {}
+
+# Cell permutations of the square's symmetries, built once per size by get_symmetries()
+SYMMETRIES = {}
+
+def get_layout(n):
+    '''
+    Returns the layout of an n x n board: variable names and ids, the string position of every cell,
+    (key, position, is_cell) for every configuration dictionary entry, (position, i, j) for every
+    inequality between variable ids i and j, and the row/column peers and units of every variable id
+    '''
+    layout = LAYOUTS.get(n)
+    if layout is not None:
+        return layout
+
+    variables = [ROW[i] + COL[j] for i in range(n) for j in range(n)]
+    cells = []
+    keys = []
+    inequalities = []
+    position = 0
+    for i in range(n):
+        for j in range(n):
+            cells.append(position)
+            keys.append((ROW[i] + COL[j], position, True))
+            position += 1
+
+            if j != n - 1:
+                keys.append((ROW[i] + COL[j] + '*', position, False))
+                inequalities.append((position, i * n + j, i * n + j + 1))
+                position += 1
+
+        if i != n - 1:
+            for j in range(n):
+                keys.append((ROW[i] + '*' + COL[j], position, False))
+                inequalities.append((position, i * n + j, (i + 1) * n + j))
+                position += 1
+
+    layout = {
+        "variables": variables,
+        "index": {variable: i for i, variable in enumerate(variables)},
+        "cells": cells,
+        "keys": keys,
+        "inequalities": inequalities,
+        "row_peers": [[(i // n) * n + c for c in range(n) if c != i % n] for i in range(n * n)],
+        "col_peers": [[r * n + i % n for r in range(n) if r != i // n] for i in range(n * n)],
+        "units": [[row * n + col for col in range(n)] for row in range(n)] + [[row * n + col for row in range(n)] for col in range(n)],
+        "var_units": [(i // n, n + i % n) for i in range(n * n)],
+    }
+    LAYOUTS[n] = layout
+    return layout
+
+def parse_config_string(config_string, n):
+    '''
+    Parses a configuration string in one pass straight into the compact representation:
+    the list of cell values by variable id and the list of (i, inequality, j) constraints.
+    Raises ValueError on a cell that is not a digit from 0 to n or an inequality other than <, > or -
+    '''
+    layout = get_layout(n)
+    values = [CELL_VALUES.get(config_string[position], -1) for position in layout["cells"]]
+    if min(values) < 0 or max(values) > n:
+        position = next(position for position, value in zip(layout["cells"], values) if not 0 <= value <= n)
+        raise ValueError("Invalid cell value {!r} at position {:d}".format(config_string[position], position))
+
+    inequalities = []
+    for position, i, j in layout["inequalities"]:
+        inequality = config_string[position]
+        if inequality != '-':
+            if inequality not in FLIPPED_INEQUALITY:
+                raise ValueError("Invalid inequality {!r} at position {:d}".format(inequality, position))
+            inequalities.append((i, inequality, j))
+    return values, inequalities
+
+def serialize_values(config_string, n, values):
+    '''
+    Returns config_string with its cells replaced by the given values, in one pass over the cell positions
+    '''
+    chars = list(config_string)
+    for position, value in zip(get_layout(n)["cells"], values):
+        chars[position] = DIGITS[value]
+    return ''.join(chars)
+
+def get_symmetries(n):
+    '''
+    Returns the 16 symmetries of an n x n board as (perm, invert) pairs: perm maps each cell id to its
+    image under one of the 8 rotations and reflections of the square (all combinations of transposing
+    and mirroring rows and columns), and invert also maps every value v to n + 1 - v
+    '''
+    symmetries = SYMMETRIES.get(n)
+    if symmetries is not None:
+        return symmetries
+
+    symmetries = []
+    for transpose in (False, True):
+        for mirror_rows in (False, True):
+            for mirror_cols in (False, True):
+                perm = []
+                for i in range(n * n):
+                    row, col = divmod(i, n)
+                    if transpose:
+                        row, col = col, row
+                    if mirror_rows:
+                        row = n - 1 - row
+                    if mirror_cols:
+                        col = n - 1 - col
+                    perm.append(row * n + col)
+                symmetries.append((perm, False))
+                symmetries.append((perm, True))
+
+    SYMMETRIES[n] = symmetries
+    return symmetries
+
+def transform_values(values, n, symmetry):
+    '''
+    Returns the values of every cell after applying symmetry to the board
+    '''
+    perm, invert = symmetry
+    transformed = [0] * len(values)
+    for i, value in enumerate(values):
+        transformed[perm[i]] = n + 1 - value if invert and value else value
+    return transformed
+
+def untransform_values(values, n, symmetry):
+    '''
+    Inverse of transform_values, maps values of the transformed board back to the original cells
+    '''
+    perm, invert = symmetry
+    return [n + 1 - values[perm[i]] if invert and values[perm[i]] else values[perm[i]] for i in range(len(values))]
+
+def canonical_form(board):
+    '''
+    Returns the canonical key of the board's givens and inequalities, the smallest config string over
+    all 16 symmetries of get_symmetries, together with the symmetry that produces it.
+    Transposing or mirroring moves each inequality to a new pair of cells, flipping it when the pair
+    is now the other way round, and value inversion flips every inequality
+    '''
+    n = board.n
+    layout = get_layout(n)
+    relations = [(i, inequality, j) for i in range(n * n) for j, inequality, _ in board.arcs[i] if i < j]
+    positions = {(i, j): position for position, i, j in layout["inequalities"]}
+    length = len(board.config_str)
+
+    best = None
+    for symmetry in get_symmetries(n):
+        perm, invert = symmetry
+        chars = ['-'] * length
+        for position, value in zip(layout["cells"], transform_values(board.values, n, symmetry)):
+            chars[position] = DIGITS[value]
+        for i, inequality, j in relations:
+            a, b = perm[i], perm[j]
+            if invert:
+                inequality = FLIPPED_INEQUALITY[inequality]
+            if a > b:
+                a, b = b, a
+                inequality = FLIPPED_INEQUALITY[inequality]
+            chars[positions[(a, b)]] = inequality
+
+        key = ''.join(chars)
+        if best is None or key < best[0]:
+            best = (key, symmetry)
+
+    return best
+
+class SolutionCache:
+    '''
+    Least recently used cache from canonical board keys (see canonical_form) to the solution of the
+    canonical board as a string of digits. With a filename, every entry is also written to a dbm file,
+    so the cache survives between runs and only the most recent capacity entries are held in memory
+    '''
+
+    def __init__(self, filename=None, capacity=100000):
+        self.entries = OrderedDict()
+        self.capacity = capacity
+        self.db = None
+        if filename:
+            import dbm
+            self.db = dbm.open(filename, "c")
+
+    def get(self, key):
+        '''
+        Returns the cached solution string for key, or None
+        '''
+        solution = self.entries.get(key)
+        if solution is not None:
+            self.entries.move_to_end(key)
+            return solution
+
+        if self.db is not None:
+            solution = self.db.get(key)
+            if solution is not None:
+                solution = solution.decode()
+                self.remember(key, solution)
+        return solution
+
+    def put(self, key, solution):
+        '''
+        Caches the solution string for key
+        '''
+        self.remember(key, solution)
+        if self.db is not None:
+            self.db[key] = solution
+
+    def remember(self, key, solution):
+        '''
+        Adds an entry to the in-memory LRU order, evicting the least recently used one if full
+        '''
+        self.entries[key] = solution
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def close(self):
+        '''
+        Closes the dbm file, if any
+        '''
+        if self.db is not None:
+            self.db.close()
+            self.db = None
 
 class Board:
     '''
     Class to represent a board, including its configuration, dimensions, and domains
     '''
     
-    def get_board_dim(self, str_len):
+    @staticmethod
+    def get_board_dim(str_len):
         '''
         Returns the side length of the board given a particular input string length
         '''
         d = 4 + 12 * str_len
-        n = (2+np.sqrt(4+12*str_len))/6
+        n = (2+math.sqrt(4+12*str_len))/6
         if(int(n) != n):
             raise Exception("Invalid configuration string length")
         
@@ -57,6 +305,20 @@ class Board:
         '''
         return self.config_str
         
+    @property
+    def config(self):
+        '''
+        The configuration dictionary, only built from the string and the current values when first used
+        '''
+        if self._config is None:
+            self._config = self.convert_string_to_dict(self.config_str)
+            self.update_config()
+        return self._config
+
+    @config.setter
+    def config(self, config_dict):
+        self._config = config_dict
+
     def get_config(self):
         '''
         Returns the configuration dictionary
@@ -67,11 +329,7 @@ class Board:
         '''
         Returns a list containing the names of all variables in the futoshiki board
         '''
-        variables = []
-        for i in range(0, self.n):
-            for j in range(0, self.n):
-                variables.append(ROW[i] + COL[j])
-        return variables
+        return list(get_layout(self.n)["variables"])
     
     def convert_string_to_dict(self, config_string):
         '''
@@ -79,24 +337,11 @@ class Board:
         as described above
         '''
         config_dict = {}
-        
-        for i in range(0, self.n):
-            for j in range(0, self.n):
-                cur = config_string[0]
-                config_string = config_string[1:]
-                
-                config_dict[ROW[i] + COL[j]] = int(cur)
-                
-                if(j != self.n - 1):
-                    cur = config_string[0]
-                    config_string = config_string[1:]
-                    config_dict[ROW[i] + COL[j] + '*'] = cur
-                    
-            if(i != self.n - 1):
-                for j in range(0, self.n):
-                    cur = config_string[0]
-                    config_string = config_string[1:]
-                    config_dict[ROW[i] + '*' + COL[j]] = cur
+        for key, position, is_cell in get_layout(self.n)["keys"]:
+            if is_cell:
+                config_dict[key] = ord(config_string[position]) - 48
+            else:
+                config_dict[key] = config_string[position]
                     
         return config_dict
         
@@ -138,110 +383,205 @@ class Board:
         if(self.n > 9):
             raise Exception("Board too big")
             
-        self.config = self.convert_string_to_dict(config_string)
+        self._config = None
+        self.values, inequalities = parse_config_string(config_string, self.n)
+        self.build_constraint_graph(inequalities)
         self.domains = self.reset_domains()
+        self.trail = []
+        self.stats = defaultdict(int)
+        self.depth_histogram = []
+
+        # Search heuristics, see select_unassigned_variable and order_values
+        self.variable_ordering = "domwdeg"
+        self.value_ordering = "lex"
+        self.weights = [1] * len(self.constraint_vars)
+        self.conflict = None
+        self.heap = None
+        self.heap_mark = 0
+        self.rng = None
+        self.fail_limit = None
+
+        # Conflict-directed backjumping, see backjumping. level[i] is the search depth variable i was
+        # assigned at (0 for givens and unassigned variables), decisions[d - 1] the (id, value) made at depth d,
+        # wipeout the ids whose domains explain the last failure, and nogoods the learned nogood store
+        self.level = [0] * len(self.values)
+        self.decisions = []
+        self.root_domains = None
+        self.wipeout = None
+        self.nogoods = None
+        self.nogood_queue = deque()
+        self.nogood_limit = 10000
+        self.max_nogood_size = 8
         
-        self.forward_checking(self.get_variables())
+        # False when the givens already contradict each other, see solve_board
+        self.consistent = self.forward_checking(range(self.n * self.n))
 
 
     def __str__(self):
         '''
         Returns a string displaying the board in a visual format. Same format as print_board()
         '''
-        output = ''
+        output = []
         config_dict = self.config
         for i in range(0, self.n):
             for j in range(0, self.n):
                 cur = config_dict[ROW[i] + COL[j]]
                 if(cur == 0):
-                    output += '_ '
+                    output.append('_ ')
                 else:
-                    output += str(cur)+ ' '
+                    output.append(str(cur) + ' ')
                 
                 if(j != self.n - 1):
                     cur = config_dict[ROW[i] + COL[j] + '*']
                     if(cur == '-'):
-                        output += '  '
+                        output.append('  ')
                     else:
-                        output += cur + ' '
-            output += '\n'
+                        output.append(cur + ' ')
+            output.append('\n')
             if(i != self.n - 1):
                 for j in range(0, self.n):
                     cur = config_dict[ROW[i] + '*' + COL[j]]
                     if(cur == '-'):
-                        output += '    '
+                        output.append('    ')
                     else:
-                        output += cur + '   '
-            output += '\n'
-        return output
+                        output.append(cur + '   ')
+            output.append('\n')
+        return ''.join(output)
         
+    def build_constraint_graph(self, inequalities):
+        '''
+        Builds the constraint graph over integer variable ids from the parsed (i, inequality, j) list, once per board.
+        Everything but the inequalities is shared between boards of the same size.
+        Variable i is self.variables[i]. row_peers[i] and col_peers[i] hold the ids sharing its row or column,
+        and arcs[i] holds (j, inequality, constraint) triples meaning value(i) inequality value(j) must hold.
+        Constraint ids number the row units, then the column units, then the inequalities; constraint_vars[c]
+        lists the variables of constraint c and var_constraints[i] the constraints on variable i
+        '''
+        layout = get_layout(self.n)
+        self.variables = layout["variables"]
+        self.index = layout["index"]
+        self.row_peers = layout["row_peers"]
+        self.col_peers = layout["col_peers"]
+
+        # Rows then columns, each an all-different unit; var_units[i] holds the row and column unit of i
+        self.units = layout["units"]
+        self.var_units = layout["var_units"]
+
+        self.constraint_vars = list(self.units)
+        self.var_constraints = [list(units) for units in self.var_units]
+        self.arcs = [[] for _ in self.variables]
+        for i, inequality, j in inequalities:
+            constraint = len(self.constraint_vars)
+            self.constraint_vars.append([i, j])
+            self.var_constraints[i].append(constraint)
+            self.var_constraints[j].append(constraint)
+            self.arcs[i].append((j, inequality, constraint))
+            self.arcs[j].append((i, FLIPPED_INEQUALITY[inequality], constraint))
+
     def reset_domains(self):
         '''
-        Resets the domains of the board assuming no enforcement of constraints
+        Resets the domains of the board assuming no enforcement of constraints.
+        Returns a list of bitmasks indexed by variable id
         '''
-        domains = {}
-        variables = self.get_variables()
-        for var in variables:
-            if(self.config[var] == 0):
-                domains[var] = [i for i in range(1,self.n+1)]
+        full = ((1 << self.n) - 1) << 1
+        domains = []
+        for value in self.values:
+            if(value == 0):
+                domains.append(full)
             else:
-                domains[var] = [self.config[var]]
+                domains.append(1 << value)
                 
         self.domains = domains
                 
         return domains
+
+    def get_domain(self, variable):
+        '''
+        Returns the values still possible for the named variable as a list
+        '''
+        return DOMAIN_VALUES[self.domains[self.index[variable]]]
+
+    def assign(self, i, value):
+        '''
+        Assigns value to variable id i, recording the old domain on the trail
+        '''
+        self.values[i] = value
+        self.trail.append((i, self.domains[i]))
+        self.domains[i] = 1 << value
+
+    def undo(self, mark):
+        '''
+        Restores every domain changed since the trail had length mark
+        '''
+        trail = self.trail
+        domains = self.domains
+        heap = self.heap
+        while len(trail) > mark:
+            i, mask = trail.pop()
+            domains[i] = mask
+            if heap is not None:
+                heapq.heappush(heap, (self.variable_priority(i), i))
+
+        if self.heap_mark > mark:
+            self.heap_mark = mark
         
     def forward_checking(self, reassigned_variables):
         '''
         Runs the forward checking algorithm to restrict the domains of variables based on the value
-        of the assigned variable.
+        of the assigned variable. Takes variable ids, and records every domain change on the trail.
+        An assigned neighbour that already breaks a constraint (givens that contradict each other)
+        fails like a wipeout. On a wipeout, self.conflict is set to the id of the constraint that caused it.
         ''' 
-        for variable in reassigned_variables:
-            value = self.config[variable]
+        values = self.values
+        domains = self.domains
+        trail = self.trail
+        for i in reassigned_variables:
+            value = values[i]
             if value != 0:
-                row_variable, col_variable = variable[0], variable[1]
-
-                # Row constraint
-                for col in COL[:self.n]:
-                    neighbor = row_variable + col
-                    if neighbor != variable and self.config[neighbor] == 0:
-                        if value in self.domains[neighbor]:
-                            self.domains[neighbor].remove(value)
-                        if not self.domains[neighbor]:
-                            return False
-                
-                # Column constraint
-                for row in ROW[:self.n]:
-                    neighbor = row + col_variable
-                    if neighbor != variable and self.config[neighbor] == 0:
-                        if value in self.domains[neighbor]:
-                            self.domains[neighbor].remove(value)
-                        if not self.domains[neighbor]:
-                            return False
+                self.stats["propagations"] += 1
+                bit = 1 << value
 
-                # Inequality constraint
-                for v1, inequality, v2 in get_inequalities(self.config):
-                    if v1 == variable and self.config[v2] == 0:
-                        new_domain = []
-                        for val in self.domains[v2]:
-                            if calculate_inequality(value, inequality, val):
-                                new_domain.append(val)
-                        
-                        self.domains[v2] = new_domain
-
-                        if not self.domains[v2]:
+                # Row and column constraints
+                for unit, peers in zip(self.var_units[i], (self.row_peers[i], self.col_peers[i])):
+                    for j in peers:
+                        if values[j] == 0:
+                            mask = domains[j]
+                            if mask & bit:
+                                trail.append((j, mask))
+                                mask ^= bit
+                                domains[j] = mask
+                                self.stats["row_col_removals"] += 1
+                            if not mask:
+                                self.conflict = unit
+                                self.wipeout = [j]
+                                return False
+                        elif values[j] == value:
+                            self.conflict = unit
+                            self.wipeout = [i, j]
                             return False
 
-                    if v2 == variable and self.config[v1] == 0:
-                        new_domain = []
-                        for val in self.domains[v1]:
-                            if calculate_inequality(val, inequality, value):
-                                new_domain.append(val)
-                        
-                        self.domains[v1] = new_domain
+                # Inequality constraints touching this variable only
+                for j, inequality, constraint in self.arcs[i]:
+                    if values[j] == 0:
+                        mask = domains[j]
+                        if inequality == '<':
+                            new_mask = mask & ~((bit << 1) - 1)
+                        else:
+                            new_mask = mask & (bit - 1)
 
-                        if not self.domains[v1]:
+                        if new_mask != mask:
+                            trail.append((j, mask))
+                            domains[j] = new_mask
+                            self.stats["inequality_removals"] += POPCOUNT[mask] - POPCOUNT[new_mask]
+
+                        if not new_mask:
+                            self.conflict = constraint
+                            self.wipeout = [j]
                             return False
+                    elif not calculate_inequality(value, inequality, values[j]):
+                        self.conflict = constraint
+                        self.wipeout = [i, j]
+                        return False
                 
         return True
         #=================================#
@@ -251,35 +591,389 @@ class Board:
     #=================================================================================#
 	#*#*#*# Optional: Write any other functions you may need in the Board Class #*#*#*#
 	#=================================================================================#
+    def arc_consistency(self, changed_variables, all_different=False):
+        '''
+        Runs AC-3 from the given variable ids until no domain changes, recording changes on the trail.
+        A variable with a single value left removes it from its row and column. An inequality arc only
+        needs the bounds of the other side, so value(i) < value(j) keeps the values of j above min(i),
+        which pushes bounds along whole chains such as A1<A2<A3<A4.
+        With all_different, every row or column touched by a change is also filtered with the global
+        all-different propagator whenever the binary queue runs dry. Returns False on a wipeout
+        '''
+        domains = self.domains
+        trail = self.trail
+        stats = self.stats
+        queue = list(changed_variables)
+        queued = [False] * len(domains)
+        for i in queue:
+            queued[i] = True
+
+        dirty_units = set()
+        if all_different:
+            for i in queue:
+                dirty_units.update(self.var_units[i])
+
+        while queue or dirty_units:
+            if not queue:
+                unit = dirty_units.pop()
+                changed = self.all_different(self.units[unit])
+                if changed is None:
+                    self.conflict = unit
+                    self.wipeout = self.units[unit]
+                    return False
+                for j in changed:
+                    dirty_units.update(self.var_units[j])
+                    if not queued[j]:
+                        queued[j] = True
+                        queue.append(j)
+                continue
+
+            i = queue.pop()
+            queued[i] = False
+            stats["propagations"] += 1
+            mask = domains[i]
+            if not mask:
+                # Already empty before propagation started, e.g. a board whose givens contradict each other
+                self.conflict = None
+                self.wipeout = [i]
+                return False
+
+            if POPCOUNT[mask] == 1:
+                for unit, peers in zip(self.var_units[i], (self.row_peers[i], self.col_peers[i])):
+                    for j in peers:
+                        peer_mask = domains[j]
+                        if peer_mask & mask:
+                            trail.append((j, peer_mask))
+                            peer_mask ^= mask
+                            domains[j] = peer_mask
+                            stats["row_col_removals"] += 1
+                            if not peer_mask:
+                                self.conflict = unit
+                                self.wipeout = [j]
+                                return False
+                            if not queued[j]:
+                                queued[j] = True
+                                queue.append(j)
+                            if all_different:
+                                dirty_units.update(self.var_units[j])
+
+            for j, inequality, constraint in self.arcs[i]:
+                arc_mask = domains[j]
+                if inequality == '<':
+                    new_mask = arc_mask & ~(((mask & -mask) << 1) - 1)
+                else:
+                    new_mask = arc_mask & ((1 << (mask.bit_length() - 1)) - 1)
+
+                if new_mask != arc_mask:
+                    trail.append((j, arc_mask))
+                    domains[j] = new_mask
+                    stats["inequality_removals"] += POPCOUNT[arc_mask] - POPCOUNT[new_mask]
+                    if not new_mask:
+                        self.conflict = constraint
+                        self.wipeout = [j]
+                        return False
+                    if not queued[j]:
+                        queued[j] = True
+                        queue.append(j)
+                    if all_different:
+                        dirty_units.update(self.var_units[j])
+
+        return True
+
+    def all_different(self, unit):
+        '''
+        Matching-based (Regin) filtering of one row or column. A row of n cells over n values is a
+        permutation, so a value stays in a cell's domain only if some perfect matching of cells to
+        values uses it. That removes every naked and hidden pair, triple, ... (Hall set) at once.
+        Returns the ids whose domains changed, or None if no perfect matching exists
+        '''
+        domains = self.domains
+        size = len(unit)
+        masks = [domains[i] for i in unit]
+        owner = [-1] * (self.n + 1)
+        matched = [0] * size
+
+        # Maximum matching with augmenting paths, cell k to value matched[k]
+        def augment(k, visited):
+            for value in DOMAIN_VALUES[masks[k] & ~visited[0]]:
+                visited[0] |= 1 << value
+                if owner[value] == -1 or augment(owner[value], visited):
+                    owner[value] = k
+                    matched[k] = value
+                    return True
+            return False
+
+        for k in range(size):
+            if not augment(k, [0]):
+                return None
+
+        # A cell keeps an unmatched value v only if it lies in the same strongly connected component
+        # as the cell matched to v, in the graph with an edge k -> owner[v] for each such value
+        edges = [[owner[value] for value in DOMAIN_VALUES[masks[k] & ~(1 << matched[k])]] for k in range(size)]
+        component = tarjan_components(edges)
+
+        changed = []
+        for k in range(size):
+            mask = masks[k]
+            keep = 1 << matched[k]
+            for value in DOMAIN_VALUES[mask & ~keep]:
+                if component[owner[value]] == component[k]:
+                    keep |= 1 << value
+
+            if keep != mask:
+                i = unit[k]
+                self.trail.append((i, mask))
+                domains[i] = keep
+                self.stats["all_different_removals"] += POPCOUNT[mask] - POPCOUNT[keep]
+                changed.append(i)
+
+        return changed
+
+    def propagate(self, changed_variables, propagation="fc"):
+        '''
+        Runs the selected propagation: "fc" for forward checking, "ac3" for full arc consistency,
+        or "alldiff" for arc consistency plus global all-different filtering of rows and columns.
+        Learned nogoods, if any, are checked afterwards
+        '''
+        if propagation == "ac3":
+            consistent = self.arc_consistency(changed_variables)
+        elif propagation == "alldiff":
+            consistent = self.arc_consistency(changed_variables, all_different=True)
+        else:
+            consistent = self.forward_checking(changed_variables)
+
+        if consistent and self.nogoods:
+            return self.check_nogoods(changed_variables)
+        return consistent
+
+    def check_nogoods(self, changed_variables):
+        '''
+        Checks the learned nogoods containing the new assignments of the given ids. A nogood is a set of
+        (id, value) assignments that cannot all hold: if all of them hold it is a conflict, and if all but
+        one hold, that value is removed from the domain of the remaining unassigned variable.
+        Returns False on a conflict or wipeout
+        '''
+        values = self.values
+        domains = self.domains
+        for i in changed_variables:
+            value = values[i]
+            if not value:
+                continue
+            for nogood in self.nogoods.get((i, value), ()):
+                free = None
+                for j, w in nogood:
+                    if values[j] == w:
+                        continue
+                    if values[j] or free is not None:
+                        break
+                    free = j, w
+                else:
+                    self.stats["nogood_hits"] += 1
+                    if free is None:
+                        self.conflict = None
+                        self.wipeout = [j for j, _ in nogood]
+                        return False
+
+                    j, w = free
+                    mask = domains[j]
+                    if mask >> w & 1:
+                        self.trail.append((j, mask))
+                        mask ^= 1 << w
+                        domains[j] = mask
+                        if not mask:
+                            self.conflict = None
+                            self.wipeout = [j]
+                            return False
+        return True
+
+    def learn_nogood(self, levels):
+        '''
+        Stores the decisions at the given levels (a bitmask) as a nogood, dropping the oldest nogood
+        once the store holds nogood_limit of them. Nogoods longer than max_nogood_size are not kept
+        '''
+        nogood = tuple(self.decisions[depth - 1] for depth in range(1, levels.bit_length()) if levels >> depth & 1)
+        if not nogood or len(nogood) > self.max_nogood_size:
+            return
+
+        if len(self.nogood_queue) >= self.nogood_limit:
+            dropped = self.nogood_queue.popleft()
+            for literal in dropped:
+                self.nogoods[literal].remove(dropped)
+        self.nogood_queue.append(nogood)
+        for literal in nogood:
+            self.nogoods.setdefault(literal, []).append(nogood)
+        self.stats["nogoods_learned"] += 1
+
+    def explain(self, i):
+        '''
+        Returns the levels (as a bitmask) of the assignments that removed values from the domain of
+        unassigned variable id i since the search started. A value counts as removed by an assigned row
+        or column peer holding it, by an assigned inequality neighbour whose value rules it out, or by a
+        nogood whose other assignments all hold, taking the earliest culprit when there are several.
+        Values removed by reasoning over unassigned variables (ac3 bounds or all-different filtering)
+        have no such culprit, and then every level is returned, which makes the jump chronological
+        '''
+        values = self.values
+        level = self.level
+        levels = 0
+        for v in DOMAIN_VALUES[self.root_domains[i] & ~self.domains[i]]:
+            best = None
+            for j in self.row_peers[i] + self.col_peers[i]:
+                if values[j] == v and level[j] and (best is None or 1 << level[j] < best):
+                    best = 1 << level[j]
+            for j, inequality, _ in self.arcs[i]:
+                w = values[j]
+                if w and level[j] and (v >= w if inequality == '<' else v <= w):
+                    if best is None or 1 << level[j] < best:
+                        best = 1 << level[j]
+            if self.nogoods:
+                for nogood in self.nogoods.get((i, v), ()):
+                    culprits = 0
+                    for j, w in nogood:
+                        if j != i:
+                            if values[j] != w:
+                                break
+                            culprits |= 1 << level[j]
+                    else:
+                        if best is None or culprits < best:
+                            best = culprits
+            if best is None:
+                return (1 << (len(self.decisions) + 1)) - 2
+            levels |= best
+        return levels
+
+    def conflict_levels(self):
+        '''
+        Returns the levels (as a bitmask) of the assignments behind the last failure: the levels of the
+        assigned variables in self.wipeout together with the explanations of the unassigned ones.
+        An assigned variable whose own domain was emptied was pruned by assignments that explain()
+        cannot name, so then every level is returned, which makes the jump chronological
+        '''
+        levels = 0
+        for i in self.wipeout:
+            if self.values[i]:
+                if not self.domains[i]:
+                    return (1 << (len(self.decisions) + 1)) - 2
+                if self.level[i]:
+                    levels |= 1 << self.level[i]
+            else:
+                levels |= self.explain(i)
+        return levels
+
+    def variable_priority(self, i):
+        '''
+        Returns the sort key of variable id i under self.variable_ordering, smallest first:
+        "mrv" orders by domain size, "degree" breaks domain size ties by the number of inequality arcs,
+        and "domwdeg" divides the domain size by the summed conflict weights of the variable's constraints
+        '''
+        size = POPCOUNT[self.domains[i]]
+        if self.variable_ordering != "domwdeg":
+            return (size << 11) | self.tie_break[i]
+
+        weights = self.weights
+        weighted_degree = 0
+        for constraint in self.var_constraints[i]:
+            weighted_degree += weights[constraint]
+        return (size / weighted_degree, self.tie_break[i])
+
     def select_unassigned_variable(self):
-        unassigned_variables = []
-        for variable, domain in self.domains.items():
-            if self.config[variable] == 0:
-                unassigned_variables.append(variable)
-        
-        minimum_length = float("inf")
-        minimum_domain = None
-        for variable in unassigned_variables:
-            if len(self.domains[variable]) < minimum_length:
-                minimum_length = len(self.domains[variable])
-                minimum_domain = variable
+        '''
+        Returns the id of the unassigned variable that comes first under self.variable_ordering,
+        None if all are assigned.
+        Keys live in a heap with lazy deletion: variables whose domains changed since the last call are
+        found on the trail and pushed with their new keys, and undo() pushes the variables it restores,
+        so only outdated or assigned entries are popped instead of rescanning every variable.
+        With self.rng set, the remaining ties are broken in a random order drawn whenever the heap is rebuilt
+        '''
+        values = self.values
+        trail = self.trail
+        if self.heap is None or len(self.heap) > 16 * len(values):
+            # Ties go to more inequality arcs for "degree" and "domwdeg", then to the lower (or random) rank
+            rank = list(range(len(values)))
+            if self.rng is not None:
+                self.rng.shuffle(rank)
+            self.tie_break = []
+            for i in range(len(values)):
+                arcs = len(self.arcs[i]) if self.variable_ordering != "mrv" else 0
+                self.tie_break.append(((15 - arcs) << 7) | rank[i])
+            self.heap = [(self.variable_priority(i), i) for i in range(len(values)) if values[i] == 0]
+            heapq.heapify(self.heap)
+        else:
+            heap = self.heap
+            priority = self.variable_priority
+            for k in range(self.heap_mark, len(trail)):
+                i = trail[k][0]
+                heapq.heappush(heap, (priority(i), i))
+        self.heap_mark = len(trail)
+
+        heap = self.heap
+        priority = self.variable_priority
+        while heap:
+            key, i = heap[0]
+            if values[i] == 0 and key == priority(i):
+                return i
+            heapq.heappop(heap)
         
-        return minimum_domain
+        return None
 
-    def update_config_str(self):
-        updated_config_str = ""
-        for i in range(self.n):
-            for j in range(self.n):
-                updated_config_str += str(self.config[ROW[i] + COL[j]])
-                
-                if j != self.n - 1:
-                    updated_config_str += self.config.get(ROW[i] + COL[j] + '*', '-')
-            
-            if i != self.n - 1:
-                for j in range(self.n):
-                    updated_config_str += self.config.get(ROW[i] + '*' + COL[j], '-')
+    def record_conflict(self):
+        '''
+        Raises the weight of the constraint behind the last wipeout, for "domwdeg" ordering
+        '''
+        if self.conflict is None:
+            return
+        self.weights[self.conflict] += 1
+        if self.heap is not None and self.variable_ordering == "domwdeg":
+            for i in self.constraint_vars[self.conflict]:
+                if self.values[i] == 0:
+                    heapq.heappush(self.heap, (self.variable_priority(i), i))
+        self.conflict = None
+
+    def order_values(self, i):
+        '''
+        Returns the values to try for variable id i: in increasing order for "lex" value ordering, or
+        least constraining first for "lcv", counting the values each one would remove from unassigned
+        row, column and inequality neighbours
+        '''
+        candidates = DOMAIN_VALUES[self.domains[i]]
+        if self.value_ordering != "lcv" or len(candidates) == 1:
+            return candidates
 
-        self.config_str = updated_config_str
+        values = self.values
+        domains = self.domains
+        neighbors = [j for j in self.row_peers[i] + self.col_peers[i] if values[j] == 0]
+        removals = []
+        for value in candidates:
+            bit = 1 << value
+            count = 0
+            for j in neighbors:
+                if domains[j] & bit:
+                    count += 1
+            for j, inequality, _ in self.arcs[i]:
+                if values[j] == 0:
+                    if inequality == '<':
+                        count += POPCOUNT[domains[j] & ((bit << 1) - 1)]
+                    else:
+                        count += POPCOUNT[domains[j] & ~(bit - 1)]
+            removals.append((count, value))
+
+        removals.sort()
+        return [value for _, value in removals]
+
+    def update_config(self):
+        '''
+        Copies the assigned values back into the configuration dictionary, if it has been built
+        '''
+        if self._config is None:
+            return
+        for variable, value in zip(self.variables, self.values):
+            self._config[variable] = value
+
+    def update_config_str(self):
+        '''
+        Writes the current values into the configuration string in one pass over its cell positions
+        '''
+        self.config_str = serialize_values(self.config_str, self.n, self.values)
     #=================================#
 	#*#*#*# Your code ends here #*#*#*#
 	#=================================#
@@ -287,21 +981,44 @@ class Board:
 #================================================================================#
 #*#*#*# Optional: You may write helper functions in this space if required #*#*#*#
 #================================================================================#        
-def get_inequalities(board):
-    inequalities = set()
-    for key, value in board.items():
-        if len(key) == 3 and '*' in key and value != "-":
-            if key[1] == '*': 
-                v1 = key[0] + key[2]
-                v2 = ROW[ROW.index(key[0]) + 1] + key[2] 
-                inequalities.add((v1, value, v2))
-
-            if key[2] == '*':  
-                v1 = key[0] + key[1]  
-                v2 = key[0] + COL[COL.index(key[1]) + 1]
-                inequalities.add((v1, value, v2))
-    
-    return inequalities
+def tarjan_components(edges):
+    '''
+    Returns the strongly connected component number of each node of a small graph given as adjacency lists
+    '''
+    index = [-1] * len(edges)
+    lowlink = [0] * len(edges)
+    component = [-1] * len(edges)
+    stack = []
+    on_stack = [False] * len(edges)
+    counter = [0, 0]
+
+    def visit(node):
+        index[node] = lowlink[node] = counter[0]
+        counter[0] += 1
+        stack.append(node)
+        on_stack[node] = True
+
+        for neighbor in edges[node]:
+            if index[neighbor] == -1:
+                visit(neighbor)
+                lowlink[node] = min(lowlink[node], lowlink[neighbor])
+            elif on_stack[neighbor]:
+                lowlink[node] = min(lowlink[node], index[neighbor])
+
+        if lowlink[node] == index[node]:
+            while True:
+                member = stack.pop()
+                on_stack[member] = False
+                component[member] = counter[1]
+                if member == node:
+                    break
+            counter[1] += 1
+
+    for node in range(len(edges)):
+        if index[node] == -1:
+            visit(node)
+
+    return component
 
 def calculate_inequality(v1, inequality, v2):
     if inequality == '<':
@@ -312,62 +1029,577 @@ def calculate_inequality(v1, inequality, v2):
 #*#*#*# Your code ends here #*#*#*#
 #=================================#
 
-def backtracking(board):
+class SearchHooks:
+    '''
+    No-op search event hooks for backtracking, subclass and override the events of interest
+    '''
+
+    def node(self, board, depth):
+        '''
+        Called on entering a search node at the given depth, before a variable is selected
+        '''
+
+    def propagation(self, board, variable, value, consistent):
+        '''
+        Called after the assignment of value to variable id has been propagated
+        '''
+
+    def failure(self, board, variable, value):
+        '''
+        Called when propagating the assignment of value to variable id wiped out a domain
+        '''
+
+    def solution(self, board):
+        '''
+        Called once the board is solved
+        '''
+
+def backtracking(board, propagation="fc", hooks=None):
     '''
-    Performs the backtracking algorithm to solve the board
+    Performs the backtracking algorithm to solve the board, propagating each assignment with
+    forward checking ("fc"), full arc consistency ("ac3") or arc consistency with all-different filtering ("alldiff").
+    The search runs on an explicit stack of [variable, values to try, next value index, trail mark] frames,
+    so board size is not bounded by the recursion limit. hooks, a SearchHooks, is told about every node,
+    propagation, failure and solution. Besides the node and backtrack counters, board.stats gets the
+    perf_counter_ns time spent selecting variables, ordering values, propagating and undoing
+    (select_ns, order_ns, propagate_ns, undo_ns), and board.depth_histogram[d] counts the nodes at depth d
     Returns only a solved board
     '''
     #==========================================================#
 	#*#*#*# TODO: Write your backtracking algorithm here #*#*#*#
 	#==========================================================#
-    check = True
-    for value in board.config.values():
-        if value == 0:
-            check = False
-    if check:
-        return board
+    stats = board.stats
+    histogram = board.depth_histogram
+    clock = time.perf_counter_ns
+    stack = []
+    descend = True
 
-    variable = board.select_unassigned_variable()
-    for value in board.domains[variable]:
-        board.config[variable] = value
+    while True:
+        if descend:
+            depth = len(stack)
+            stats["nodes"] += 1
+            while len(histogram) <= depth:
+                histogram.append(0)
+            histogram[depth] += 1
+            if hooks is not None:
+                hooks.node(board, depth)
 
-        domains_copy = {}
-        for var in board.domains:
-            domains_copy[var] = board.domains[var].copy()
-        
-        board.domains[variable] = [value]
+            start = clock()
+            variable = board.select_unassigned_variable()
+            stats["select_ns"] += clock() - start
+            if variable is None:
+                board.update_config()
+                if hooks is not None:
+                    hooks.solution(board)
+                return board
 
-        if board.forward_checking([variable]):
-            result = backtracking(board)
-            if result:
-                return result
+            start = clock()
+            stack.append([variable, board.order_values(variable), 0, 0])
+            stats["order_ns"] += clock() - start
+
+        frame = stack[-1]
+        variable, candidates, k, _ = frame
+        if k == len(candidates):
+            # Every value failed, so the assignment one level up fails too
+            stack.pop()
+            if not stack:
+                return None
+            frame = stack[-1]
+            variable = frame[0]
+        else:
+            value = candidates[k]
+            frame[2] = k + 1
+            frame[3] = len(board.trail)
+            board.assign(variable, value)
+
+            start = clock()
+            consistent = board.propagate([variable], propagation)
+            stats["propagate_ns"] += clock() - start
+            if hooks is not None:
+                hooks.propagation(board, variable, value, consistent)
+            if consistent:
+                descend = True
+                continue
+
+            board.record_conflict()
+            if hooks is not None:
+                hooks.failure(board, variable, value)
 
-        board.config[variable] = 0
-        board.domains = domains_copy
+        start = clock()
+        board.values[variable] = 0
+        board.undo(frame[3])
+        stats["undo_ns"] += clock() - start
+        stats["backtracks"] += 1
+        descend = False
 
-    return None
+        if board.fail_limit is not None and stats["backtracks"] >= board.fail_limit:
+            # Restart: retract the assignments still standing below this frame
+            for frame in reversed(stack[:-1]):
+                board.values[frame[0]] = 0
+                board.undo(frame[3])
+            return None
     #=================================#
 	#*#*#*# Your code ends here #*#*#*#
 	#=================================#
+
+def backjumping(board, propagation="fc"):
+    '''
+    Backtracking with conflict-directed backjumping and nogood learning. Every failure comes with its
+    conflict set, the levels of the earlier assignments that caused it (see Board.explain). A variable
+    whose values all fail returns the union of their conflict sets, and search jumps straight back to
+    the deepest level in it instead of the previous one; the assignments in the set are also learned
+    as a nogood. Jumps that skip levels are counted in board.stats as backjumps and backjump_levels.
+    Returns the solved board and 0, or None and the conflict set of the failed subtree as a bitmask of levels
+    '''
+    board.stats["nodes"] += 1
+    variable = board.select_unassigned_variable()
+    if variable is None:
+        board.update_config()
+        return board, 0
+
+    depth = len(board.decisions) + 1
+    bit = 1 << depth
+    conflict = board.explain(variable)
+    for value in board.order_values(variable):
+        mark = len(board.trail)
+        board.assign(variable, value)
+        board.level[variable] = depth
+        board.decisions.append((variable, value))
+
+        if board.propagate([variable], propagation):
+            result, child_conflict = backjumping(board, propagation)
+            if result:
+                return result, 0
+        else:
+            board.record_conflict()
+            child_conflict = board.conflict_levels()
+
+        board.decisions.pop()
+        board.level[variable] = 0
+        board.values[variable] = 0
+        board.undo(mark)
+        board.stats["backtracks"] += 1
+        if board.fail_limit is not None and board.stats["backtracks"] >= board.fail_limit:
+            return None, 0
+
+        # The failure below did not depend on this assignment, so no other value can fix it
+        if not child_conflict & bit:
+            return None, child_conflict
+        conflict |= child_conflict & ~bit
+
+    board.learn_nogood(conflict)
+    skipped = depth - conflict.bit_length()
+    if skipped > 0:
+        board.stats["backjumps"] += 1
+        board.stats["backjump_levels"] += skipped
+    return None, conflict
     
-def solve_board(board):
+def solve_board(board, propagation="fc", variable_ordering="domwdeg", value_ordering="lex", engine="backtracking",
+                backjumping_search=False, restarts=False, seed=None, cache=None, hooks=None):
     '''
-    Runs the backtrack helper and times its performance.
-    Returns the solved board and the runtime
+    Runs the backtrack helper, or the SAT solver with engine="sat", and times its performance.
+    variable_ordering is "mrv", "degree" or "domwdeg" and value_ordering is "lex" or "lcv", see Board.
+    With "ac3" or "alldiff" propagation the whole board is made consistent before searching.
+    backjumping_search replaces backtracking with conflict-directed backjumping and nogood learning.
+    With restarts, the k-th search run gives up after RESTART_BASE * luby(k) failures and starts again
+    from the root with ties broken in a new random order, keeping the domwdeg weights and nogoods
+    learned so far. A seed alone randomizes tie-breaking without restarting.
+    With a SolutionCache, the board's canonical form is looked up first and a cached solution is mapped
+    back through the inverse symmetry; new solutions are stored in canonical form.
+    hooks (a SearchHooks) are passed on to backtracking.
+    Returns the solved board, or None if the board has no solution, and the runtime, with search
+    counters left in board.stats
     '''
     #================================================================#
 	#*#*#*# TODO: Call your backtracking algorithm and time it #*#*#*#
 	#================================================================#
+    board.variable_ordering = variable_ordering
+    board.value_ordering = value_ordering
+    board.heap = None
+    board.rng = random.Random(seed) if restarts or seed is not None else None
     start_time = time.time()
-    solved_board = backtracking(board)
+    solved_board = None
+    cached = None
+    if cache is not None:
+        key, symmetry = canonical_form(board)
+        cached = cache.get(key)
+
+    if cached is not None:
+        board.values = untransform_values([int(digit) for digit in cached], board.n, symmetry)
+        board.domains = [1 << value for value in board.values]
+        board.update_config()
+        board.stats["cache_hits"] += 1
+        solved_board = board
+    elif engine == "sat":
+        solved_board = sat_solve(board)
+    elif board.consistent if propagation == "fc" else board.propagate(range(board.n * board.n), propagation):
+        if backjumping_search:
+            board.root_domains = list(board.domains)
+            board.nogoods = {}
+
+        if restarts:
+            from cdcl import luby
+
+        run = 0
+        while True:
+            if restarts:
+                run += 1
+                board.fail_limit = board.stats["backtracks"] + RESTART_BASE * luby(run)
+                board.heap = None
+            if backjumping_search:
+                solved_board, _ = backjumping(board, propagation)
+            else:
+                solved_board = backtracking(board, propagation, hooks)
+            if solved_board or not restarts or board.stats["backtracks"] < board.fail_limit:
+                break
+            board.stats["restarts"] += 1
+        board.fail_limit = None
+
+    if cache is not None and cached is None and solved_board:
+        cache.put(key, ''.join(DIGITS[value] for value in transform_values(solved_board.values, board.n, symmetry)))
+        board.stats["cache_misses"] += 1
     end_time = time.time()
-    solved_board.update_config_str()
+    board.stats["time"] = end_time - start_time
+    if solved_board:
+        solved_board.update_config_str()
 
     return solved_board, end_time - start_time 
     #=================================#
 	#*#*#*# Your code ends here #*#*#*#
 	#=================================#
 
+def sat_solve(board):
+    '''
+    Solves the board with the CDCL solver in cdcl.py and decodes the model into board.values and board.config.
+    Variable x(i, v) means cell i holds v, and order variable y(i, v) means cell i holds at most v.
+    Cells and rows/columns get at-least-one and pairwise at-most-one clauses over the x variables, the
+    y variables are channelled to the x variables, and value(i) < value(j) becomes y(j, v) -> y(i, v - 1)
+    for every v. Values already pruned from the domains become unit clauses.
+    Returns the solved board, or None if it has no solution
+    '''
+    from cdcl import CDCLSolver
+
+    n = board.n
+    solver = CDCLSolver()
+    x = [[0] + [solver.new_var() for _ in range(n)] for _ in board.values]
+    y = [[0] + [solver.new_var() for _ in range(n - 1)] for _ in board.values]
+
+    # Literal for value(i) <= v, with True and False standing for the constant bounds
+    def at_most(i, v):
+        if v <= 0:
+            return False
+        if v >= n:
+            return True
+        return y[i][v]
+
+    def add(*literals):
+        if any(literal is True for literal in literals):
+            return
+        solver.add_clause([literal for literal in literals if literal is not False])
+
+    def negate(literal):
+        if literal is True or literal is False:
+            return not literal
+        return -literal
+
+    for i, domain in enumerate(board.domains):
+        add(*[x[i][v] for v in DOMAIN_VALUES[domain]])
+        for v in range(1, n + 1):
+            if not domain >> v & 1:
+                add(-x[i][v])
+            for w in range(v + 1, n + 1):
+                add(-x[i][v], -x[i][w])
+
+            add(-x[i][v], at_most(i, v))
+            add(-x[i][v], negate(at_most(i, v - 1)))
+            add(negate(at_most(i, v)), at_most(i, v - 1), x[i][v])
+            if v < n - 1:
+                add(-y[i][v], y[i][v + 1])
+
+    for unit in board.units:
+        for v in range(1, n + 1):
+            add(*[x[i][v] for i in unit])
+            for a in range(len(unit)):
+                for b in range(a + 1, len(unit)):
+                    add(-x[unit[a]][v], -x[unit[b]][v])
+
+    for i in range(len(board.values)):
+        for j, inequality, _ in board.arcs[i]:
+            if inequality == '<':
+                for v in range(1, n + 1):
+                    add(negate(at_most(j, v)), at_most(i, v - 1))
+
+    satisfiable = solver.solve()
+    for counter, value in solver.stats.items():
+        board.stats[counter] += value
+    board.stats["nodes"] += solver.stats["decisions"]
+    if not satisfiable:
+        return None
+
+    for i in range(len(board.values)):
+        for v in range(1, n + 1):
+            if solver.model_value(x[i][v]):
+                board.values[i] = v
+                board.domains[i] = 1 << v
+    board.update_config()
+    return board
+
+def solve_portfolio(board, portfolio=PORTFOLIO):
+    '''
+    Races the solve_board configurations in portfolio on the board, one process each. The first
+    answer wins and the other processes are terminated.
+    Returns the solved board, with the winner's counters and a portfolio_<name>_wins counter in
+    board.stats, and the wall time of the race
+    '''
+    import multiprocessing
+
+    start_time = time.time()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=race_config_string, args=(k, board.config_str, options, results))
+                 for k, (_, options) in enumerate(portfolio)]
+    for process in processes:
+        process.start()
+
+    solved_board = None
+    try:
+        for _ in processes:
+            k, values, stats = results.get()
+            if values is not None:
+                board.values = values
+                board.stats.update(stats)
+                board.stats["portfolio_" + portfolio[k][0] + "_wins"] += 1
+                board.update_config()
+                board.update_config_str()
+                solved_board = board
+                break
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+    runtime = time.time() - start_time
+    board.stats["time"] = runtime
+    return solved_board, runtime
+
+def race_config_string(k, config_string, options, results):
+    '''
+    Solves one configuration string in a portfolio process and reports the values and search counters,
+    or None values if the configuration failed
+    '''
+    try:
+        board = Board(config_string)
+        solved_board, _ = solve_board(board, **options)
+        results.put((k, solved_board.values if solved_board else None, dict(board.stats)))
+    except Exception:
+        results.put((k, None, {}))
+
+def count_solutions(board, limit=2, propagation="alldiff", processes=1):
+    '''
+    Counts the solutions of the board with the same propagation and ordering machinery as backtracking,
+    stopping as soon as limit solutions are found (limit=None counts them all).
+    With processes other than 1, the values of the first branching variable are counted in a process pool
+    (None for all cores) and the pool is stopped once the limit is reached.
+    Returns the number of solutions found, at most limit; the board is left as it was
+    '''
+    mark = len(board.trail)
+    count = 0
+    if board.propagate(range(board.n * board.n), propagation):
+        if processes == 1:
+            count = count_from(board, limit, propagation)
+        else:
+            variable = board.select_unassigned_variable()
+            if variable is None:
+                count = 1
+            else:
+                import multiprocessing
+
+                tasks = []
+                for value in board.order_values(variable):
+                    values = list(board.values)
+                    values[variable] = value
+                    tasks.append((serialize_values(board.config_str, board.n, values), limit, propagation))
+
+                with multiprocessing.Pool(processes) as pool:
+                    for subtree_count in pool.imap_unordered(count_config_string, tasks):
+                        count += subtree_count
+                        if limit is not None and count >= limit:
+                            count = limit
+                            break
+    board.undo(mark)
+    return count
+
+def count_from(board, limit, propagation):
+    '''
+    Recursive helper of count_solutions, counts the solutions below the current node up to limit
+    '''
+    board.stats["nodes"] += 1
+    variable = board.select_unassigned_variable()
+    if variable is None:
+        return 1
+
+    count = 0
+    for value in board.order_values(variable):
+        mark = len(board.trail)
+        board.assign(variable, value)
+
+        if board.propagate([variable], propagation):
+            count += count_from(board, None if limit is None else limit - count, propagation)
+        else:
+            board.record_conflict()
+
+        board.values[variable] = 0
+        board.undo(mark)
+        if limit is not None and count >= limit:
+            break
+
+    return count
+
+def count_config_string(task):
+    '''
+    Counts the solutions of one configuration string in a worker process
+    '''
+    config_string, limit, propagation = task
+    return count_solutions(Board(config_string), limit, propagation)
+
+def solve_config_string(task):
+    '''
+    Solves one configuration string for batch mode.
+    Returns the input string, the solved string (NO_SOLUTION if there is none), the runtime, the search
+    counters, the depth histogram and the entries of the in-memory cache in options, if any
+    '''
+    config_string, options = task
+    board = Board(config_string)
+    solved_board, runtime = solve_board(board, **options)
+    solved_string = solved_board.get_config_str() if solved_board else NO_SOLUTION
+    entries = dict(options["cache"].entries) if options.get("cache") is not None else {}
+    return config_string, solved_string, runtime, dict(board.stats), board.depth_histogram, entries
+
+def solve_batch(config_strings, outfile, processes=None, profile_file=None, **options):
+    '''
+    Solves a stream of configuration strings in a process pool without printing the boards,
+    writing each solved string to outfile in input order as soon as it and every earlier board are done.
+    With profile_file, a write_profile line is written per board as well.
+    options are passed on to solve_board. A SolutionCache in options stays in this process: each board
+    is looked up here and sent with an in-memory cache holding its entry, if any, and the solutions found
+    by the workers are stored here.
+    Returns the runtimes and search counters of all the boards
+    '''
+    import multiprocessing
+    import threading
+
+    options = dict(options)
+    cache = options.pop("cache", None)
+    # The pool feeds tasks from a thread of its own, so lookups there and stores here take turns
+    cache_lock = threading.Lock()
+
+    def tasks():
+        for config_string in config_strings:
+            if cache is None:
+                yield config_string, options
+                continue
+            task_cache = SolutionCache()
+            key = canonical_form(Board(config_string))[0]
+            with cache_lock:
+                solution = cache.get(key)
+            if solution is not None:
+                task_cache.put(key, solution)
+            yield config_string, dict(options, cache=task_cache)
+
+    runtimes = []
+    board_stats = []
+    with multiprocessing.Pool(processes) as pool:
+        for config_string, solved_string, runtime, stats, histogram, entries in pool.imap(solve_config_string, tasks(), chunksize=4):
+            if stats.get("cache_misses"):
+                with cache_lock:
+                    for key, solution in entries.items():
+                        cache.put(key, solution)
+            outfile.write(solved_string)
+            outfile.write('\n')
+            runtimes.append(runtime)
+            board_stats.append(stats)
+            if profile_file is not None:
+                write_profile(profile_file, config_string, runtime, stats, histogram)
+
+    return runtimes, board_stats
+
+def write_profile(profile_file, config_string, runtime, stats, depth_histogram):
+    '''
+    Writes the runtime, search counters and depth histogram of one board as a JSON line
+    '''
+    profile_file.write(json.dumps({"board": config_string, "runtime": runtime, "stats": stats,
+                                   "depth_histogram": depth_histogram}))
+    profile_file.write('\n')
+
+def serve_lines(lines, write, **options):
+    '''
+    Service loop: solves each configuration string read from lines with solve_board(**options) and
+    writes one JSON line per board with the solved string (null if the board has no solution), the
+    runtime and the search counters, or the error if the board could not be read. Blank lines are skipped
+    '''
+    for line in lines:
+        config_string = line.strip()
+        if not config_string:
+            continue
+        try:
+            board = Board(config_string)
+            solved_board, runtime = solve_board(board, **options)
+            response = {"board": config_string, "solution": solved_board.get_config_str() if solved_board else None,
+                        "runtime": runtime, "stats": board.stats}
+        except Exception as error:
+            response = {"board": config_string, "error": str(error)}
+        write(json.dumps(response) + '\n')
+
+def serve_socket(path, **options):
+    '''
+    Serves serve_lines on a Unix socket at path, one connection at a time, until interrupted
+    '''
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            def write(text):
+                self.wfile.write(text.encode())
+                self.wfile.flush()
+            serve_lines((raw.decode() for raw in self.rfile), write, **options)
+
+    if os.path.exists(path):
+        os.remove(path)
+    with socketserver.UnixStreamServer(path, Handler) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    os.remove(path)
+
+def benchmark_io(config_strings, count=100000):
+    '''
+    Times parsing, full board construction and serialization over count boards, cycling through config_strings
+    '''
+    boards = [config_strings[k % len(config_strings)] for k in range(count)]
+
+    start_time = time.perf_counter()
+    for config_string in boards:
+        parse_config_string(config_string, Board.get_board_dim(len(config_string)))
+    parse_time = time.perf_counter() - start_time
+
+    construct_time = 0
+    serialize_time = 0
+    for config_string in boards:
+        start_time = time.perf_counter()
+        board = Board(config_string)
+        middle_time = time.perf_counter()
+        board.update_config_str()
+        board.get_config_str()
+        construct_time += middle_time - start_time
+        serialize_time += time.perf_counter() - middle_time
+
+    print("\nParsing Benchmark:")
+    print("Number of Boards = {:d}".format(count))
+    print("Parse Time = {:.4f}s ({:.0f} boards/s)".format(parse_time, count / parse_time))
+    print("Board Construction Time = {:.4f}s ({:.0f} boards/s)".format(construct_time, count / construct_time))
+    print("Serialization Time = {:.4f}s ({:.0f} boards/s)".format(serialize_time, count / serialize_time))
+
 def print_stats(runtimes):
     '''
     Prints a statistical summary of the runtimes of all the boards
@@ -391,7 +1623,7 @@ def print_stats(runtimes):
     for runtime in runtimes:
         sum_diff_squared += (runtime-mean)*(runtime-mean)
 
-    std_dev = np.sqrt(sum_diff_squared/n)
+    std_dev = math.sqrt(sum_diff_squared/n)
 
     print("\nRuntime Statistics:")
     print("Number of Boards = {:d}".format(n))
@@ -401,35 +1633,140 @@ def print_stats(runtimes):
     print("Standard Deviation of Runtime = {:.8f}".format(std_dev))
     print("Total Runtime = {:.8f}".format(sum))
 
+def print_search_stats(board_stats):
+    '''
+    Prints the search counters summed over all the boards
+    '''
+    totals = defaultdict(int)
+    for stats in board_stats:
+        for counter, value in stats.items():
+            totals[counter] += value
+
+    print("\nSearch Statistics:")
+    for counter in sorted(totals):
+        if counter == "time":
+            continue
+        if counter.endswith("_ns"):
+            print("Total {} Time = {:.3f}ms".format(counter[:-3].title(), totals[counter] / 1e6))
+        else:
+            print("Total {} = {:d}".format(counter.replace("_", " ").title(), totals[counter]))
+    if totals["time"] > 0:
+        print("Nodes per Second = {:.1f}".format(totals["nodes"] / totals["time"]))
+
 
 if __name__ == '__main__':
-    if len(sys.argv) > 1:
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Futoshiki solver')
+    parser.add_argument('board', nargs='?', help="Board configuration string (default: solve every board in futoshiki_start.txt)")
+    parser.add_argument('--propagation', choices=["fc", "ac3", "alldiff"], default="fc", help="Constraint propagation used during search")
+    parser.add_argument('--variable-ordering', choices=["mrv", "degree", "domwdeg"], default="domwdeg", help="Variable ordering heuristic")
+    parser.add_argument('--value-ordering', choices=["lex", "lcv"], default="lex", help="Value ordering heuristic")
+    parser.add_argument('--engine', choices=["backtracking", "sat"], default="backtracking", help="Search engine used to solve each board")
+    parser.add_argument('--backjumping', action="store_true", default=False, help="Use conflict-directed backjumping with nogood learning instead of chronological backtracking")
+    parser.add_argument('--restarts', action="store_true", default=False, help="Restart the search on a Luby schedule with randomized tie-breaking")
+    parser.add_argument('--seed', type=int, help="Seed for randomized tie-breaking")
+    parser.add_argument('--portfolio', action="store_true", default=False, help="Race the PORTFOLIO configurations on each board in separate processes and keep the first answer")
+    parser.add_argument('--serve', action="store_true", default=False, help="Service mode: solve config strings read line by line from stdin (or --socket) and write JSON lines")
+    parser.add_argument('--socket', metavar='PATH', help="With --serve, listen on a Unix socket at PATH instead of stdin")
+    parser.add_argument('--profile', metavar='FILE', help="Write the runtime, search counters and depth histogram of every board to FILE as JSON lines")
+    parser.add_argument('--cache', metavar='FILE', help="Look boards up by canonical form in this solution cache file first, and store new solutions in it")
+    parser.add_argument('--benchmark-io', type=int, metavar='N', help="Benchmark parsing and serialization on N boards cycled from futoshiki_start.txt")
+    parser.add_argument('--count', type=int, metavar='LIMIT', help="Count the solutions of each board up to LIMIT instead of solving it")
+    parser.add_argument('--processes', type=int, default=1, help="Solve futoshiki_start.txt in parallel with this many worker processes, without printing boards (0 for all cores)")
+    args = parser.parse_args()
+    options = {"propagation": args.propagation, "variable_ordering": args.variable_ordering,
+               "value_ordering": args.value_ordering, "engine": args.engine, "backjumping_search": args.backjumping,
+               "restarts": args.restarts, "seed": args.seed}
+    # The cache file is opened once here, and only this process reads and writes it (see solve_batch)
+    if args.cache:
+        options["cache"] = SolutionCache(args.cache)
+    profile_file = open(args.profile, "w") if args.profile else None
+
+    if args.serve:
+        # Service mode $python3 futoshiki.py --serve [--socket <path>], one config string per line in
+        if args.socket:
+            serve_socket(args.socket, **options)
+        else:
+            def write(text):
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            serve_lines(sys.stdin, write, **options)
+
+    elif args.benchmark_io:
+        with open('futoshiki_start.txt', "r") as srcfile:
+            benchmark_io([line.strip() for line in srcfile if line.strip()], args.benchmark_io)
+
+    elif args.count:
+        # Checking solution counts $python3 futoshiki.py --count 2 [<input_string>]
+        if args.board:
+            config_strings = [args.board]
+        else:
+            with open('futoshiki_start.txt', "r") as srcfile:
+                config_strings = [line.strip() for line in srcfile if line.strip()]
+
+        processes = args.processes or None
+        counts = []
+        runtimes = []
+        for config_string in config_strings:
+            start_time = time.time()
+            counts.append(count_solutions(Board(config_string), args.count, args.propagation, processes))
+            runtimes.append(time.time() - start_time)
+            print("{:d} {}".format(counts[-1], config_string))
+
+        print("\nBoards with exactly one solution = {:d} of {:d}".format(counts.count(1), len(counts)))
+        print_stats(runtimes)
+
+    elif args.board:
 
         # Running futoshiki solver with one board $python3 futoshiki.py <input_string>.
         print("\nInput String:")
-        print(sys.argv[1])
+        print(args.board)
         
         print("\nFormatted Input Board:")
-        board = Board(sys.argv[1])
+        board = Board(args.board)
         board.print_board()
         
-        solved_board, runtime = solve_board(board)
+        solved_board, runtime = solve_portfolio(board) if args.portfolio else solve_board(board, **options)
+        solved_string = solved_board.get_config_str() if solved_board else NO_SOLUTION
         
         print("\nSolved String:")
-        print(solved_board.get_config_str())
+        print(solved_string)
         
-        print("\nFormatted Solved Board:")
-        solved_board.print_board()
+        if solved_board:
+            print("\nFormatted Solved Board:")
+            solved_board.print_board()
         
         print_stats([runtime])
+        print_search_stats([board.stats])
+        if profile_file is not None:
+            write_profile(profile_file, args.board, runtime, board.stats, board.depth_histogram)
 
         # Write board to file
         out_filename = 'output.txt'
         outfile = open(out_filename, "w")
-        outfile.write(solved_board.get_config_str())
+        outfile.write(solved_string)
         outfile.write('\n')
         outfile.close()
 
+    elif args.processes != 1 and not args.portfolio:
+        # Running futoshiki solver for boards in futoshiki_start.txt in parallel $python3 futoshiki.py --processes <n>
+        src_filename = 'futoshiki_start.txt'
+        try:
+            srcfile = open(src_filename, "r")
+        except OSError:
+            print("Error reading the futoshiki file %s" % src_filename)
+            exit()
+
+        with srcfile, open('output.txt', "w") as outfile:
+            config_strings = (line.strip() for line in srcfile if line.strip())
+            runtimes, board_stats = solve_batch(config_strings, outfile, args.processes or None, profile_file, **options)
+
+        # Timing Runs
+        print_stats(runtimes)
+        print_search_stats(board_stats)
+        print("\nFinished all boards in file.\n")
+
     else:
         # Running futoshiki solver for boards in futoshiki_start.txt $python3 futoshiki.py
 
@@ -448,6 +1785,7 @@ if __name__ == '__main__':
         outfile = open(out_filename, "w")
         
         runtimes = []
+        board_stats = []
 
         # Solve each board using backtracking
         for line in futoshiki_list.split("\n"):
@@ -459,21 +1797,32 @@ if __name__ == '__main__':
             board = Board(line)
             board.print_board()
             
-            solved_board, runtime = solve_board(board)
+            solved_board, runtime = solve_portfolio(board) if args.portfolio else solve_board(board, **options)
+            solved_string = solved_board.get_config_str() if solved_board else NO_SOLUTION
             runtimes.append(runtime)
+            board_stats.append(board.stats)
+            if profile_file is not None:
+                write_profile(profile_file, line, runtime, board.stats, board.depth_histogram)
             
             print("\nSolved String:")
-            print(solved_board.get_config_str())
+            print(solved_string)
             
-            print("\nFormatted Solved Board:")
-            solved_board.print_board()
+            if solved_board:
+                print("\nFormatted Solved Board:")
+                solved_board.print_board()
 
             # Write board to file
-            outfile.write(solved_board.get_config_str())
+            outfile.write(solved_string)
             outfile.write('\n')
 
         # Timing Runs
         print_stats(runtimes)
+        print_search_stats(board_stats)
         
         outfile.close()
         print("\nFinished all boards in file.\n")
+
+    if args.cache:
+        options["cache"].close()
+    if profile_file is not None:
+        profile_file.close()
@@ -0,0 +1,186 @@
+"""
+Seeded futoshiki puzzle generator and difficulty-graded benchmark runner.
+
+Generate a corpus, one file of config strings per difficulty bucket:
+$python3 futoshiki_generator.py generate --count 200 --sizes 4-9 --output corpus
+
+Benchmark the solver on it, with the same options as futoshiki.py:
+$python3 futoshiki_generator.py benchmark --corpus corpus --propagation alldiff
+
+Each corpus file uses the futoshiki_start.txt format, so it can also be
+copied over futoshiki_start.txt and solved directly.
+"""
+import argparse
+import os
+import random
+import time
+
+from futoshiki import Board, DIGITS, get_layout, solve_board, count_solutions, print_stats
+
+# Buckets by the search nodes per empty cell the reference solver needs, as (name, largest ratio).
+# The reference is fixed so that grades do not move when the default solver options change
+DIFFICULTY_BUCKETS = [("easy", 1.1), ("medium", 1.5), ("hard", 4.0), ("extreme", None)]
+REFERENCE_OPTIONS = {"propagation": "fc", "variable_ordering": "mrv", "value_ordering": "lex"}
+
+def random_latin_square(n, rng):
+    '''
+    Returns a random n x n latin square as a flat list, by shuffling the rows, columns and
+    symbols of the cyclic square and transposing it half the time
+    '''
+    rows = list(range(n))
+    cols = list(range(n))
+    symbols = list(range(1, n + 1))
+    rng.shuffle(rows)
+    rng.shuffle(cols)
+    rng.shuffle(symbols)
+
+    square = [symbols[(rows[i] + cols[j]) % n] for i in range(n) for j in range(n)]
+    if rng.random() < 0.5:
+        square = [square[j * n + i] for i in range(n) for j in range(n)]
+    return square
+
+def make_config_string(n, solution, givens, inequalities):
+    '''
+    Returns the config string of a board showing the given cell ids and the inequalities at the
+    given string positions, both taken from the solution
+    '''
+    layout = get_layout(n)
+    chars = ['-'] * (2 * n * n - n + n * (n - 1))
+    for i, position in enumerate(layout["cells"]):
+        chars[position] = DIGITS[solution[i]] if i in givens else '0'
+    for position, i, j in layout["inequalities"]:
+        if position in inequalities:
+            chars[position] = '<' if solution[i] < solution[j] else '>'
+    return ''.join(chars)
+
+def generate_puzzle(n, rng, given_fraction=0.2, inequality_fraction=0.3, unique=True):
+    '''
+    Generates one n x n puzzle with about given_fraction of the cells filled and inequality_fraction
+    of the adjacent pairs marked. With unique, random cells of the solution are revealed until the
+    puzzle has exactly one solution.
+    Returns the config string
+    '''
+    solution = random_latin_square(n, rng)
+    cells = list(range(n * n))
+    rng.shuffle(cells)
+    positions = [position for position, _, _ in get_layout(n)["inequalities"]]
+
+    given_count = int(round(given_fraction * n * n))
+    givens = set(cells[:given_count])
+    inequalities = set(rng.sample(positions, int(round(inequality_fraction * len(positions)))))
+
+    config_string = make_config_string(n, solution, givens, inequalities)
+    while unique and given_count < n * n and count_solutions(Board(config_string), 2) > 1:
+        givens.add(cells[given_count])
+        given_count += 1
+        config_string = make_config_string(n, solution, givens, inequalities)
+
+    return config_string
+
+def grade_puzzle(config_string):
+    '''
+    Returns the difficulty bucket of a puzzle and the nodes the reference solver needed for it
+    '''
+    board = Board(config_string)
+    solve_board(board, **REFERENCE_OPTIONS)
+    nodes = board.stats["nodes"]
+    ratio = nodes / max(1, config_string.count('0'))
+    for name, largest in DIFFICULTY_BUCKETS:
+        if largest is None or ratio <= largest:
+            return name, nodes
+
+def generate_corpus(count, sizes, seed, given_fraction, inequality_fraction, output_dir, unique=True):
+    '''
+    Generates count puzzles with sizes drawn from sizes, grades them and writes one
+    <bucket>.txt file of config strings per difficulty bucket into output_dir.
+    Returns the number of puzzles in each bucket
+    '''
+    rng = random.Random(seed)
+    buckets = {name: [] for name, _ in DIFFICULTY_BUCKETS}
+    for _ in range(count):
+        config_string = generate_puzzle(rng.choice(sizes), rng, given_fraction, inequality_fraction, unique)
+        bucket, _ = grade_puzzle(config_string)
+        buckets[bucket].append(config_string)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name, config_strings in buckets.items():
+        with open(os.path.join(output_dir, name + ".txt"), "w") as outfile:
+            outfile.write("\n".join(config_strings))
+
+    return {name: len(config_strings) for name, config_strings in buckets.items()}
+
+def run_benchmark(corpus_dir, **options):
+    '''
+    Solves every board of every bucket file in corpus_dir with solve_board(**options) and prints
+    the runtime statistics and nodes per second of each bucket
+    '''
+    for name, _ in DIFFICULTY_BUCKETS:
+        filename = os.path.join(corpus_dir, name + ".txt")
+        if not os.path.exists(filename):
+            continue
+        with open(filename) as srcfile:
+            config_strings = [line.strip() for line in srcfile if line.strip()]
+        if not config_strings:
+            continue
+
+        runtimes = []
+        nodes = 0
+        for config_string in config_strings:
+            board = Board(config_string)
+            _, runtime = solve_board(board, **options)
+            runtimes.append(runtime)
+            nodes += board.stats["nodes"]
+
+        print("\nDifficulty: " + name)
+        print_stats(runtimes)
+        print("Total Nodes = {:d}".format(nodes))
+        print("Nodes per Second = {:.1f}".format(nodes / sum(runtimes) if sum(runtimes) > 0 else 0.0))
+
+def parse_sizes(sizes):
+    '''
+    Parses a size list such as "4-9" or "5,7,9"
+    '''
+    result = []
+    for part in sizes.split(","):
+        if "-" in part:
+            low, high = part.split("-")
+            result += list(range(int(low), int(high) + 1))
+        else:
+            result.append(int(part))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Futoshiki puzzle generator and benchmark')
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="Generate a difficulty-graded corpus")
+    generate_parser.add_argument('--count', type=int, default=100, help="Number of puzzles")
+    generate_parser.add_argument('--sizes', default="4-9", help="Board sizes, e.g. 4-9 or 5,7")
+    generate_parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    generate_parser.add_argument('--givens', type=float, default=0.2, help="Fraction of cells filled in")
+    generate_parser.add_argument('--inequalities', type=float, default=0.3, help="Fraction of adjacent pairs with an inequality")
+    generate_parser.add_argument('--allow-multiple', action="store_true", default=False, help="Do not force a unique solution")
+    generate_parser.add_argument('--output', default="corpus", help="Output directory")
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="Benchmark the solver on a corpus")
+    benchmark_parser.add_argument('--corpus', default="corpus", help="Corpus directory")
+    benchmark_parser.add_argument('--propagation', choices=["fc", "ac3", "alldiff"], default="fc", help="Constraint propagation used during search")
+    benchmark_parser.add_argument('--variable-ordering', choices=["mrv", "degree", "domwdeg"], default="domwdeg", help="Variable ordering heuristic")
+    benchmark_parser.add_argument('--value-ordering', choices=["lex", "lcv"], default="lex", help="Value ordering heuristic")
+    benchmark_parser.add_argument('--engine', choices=["backtracking", "sat"], default="backtracking", help="Search engine used to solve each board")
+    benchmark_parser.add_argument('--backjumping', action="store_true", default=False, help="Use conflict-directed backjumping with nogood learning")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        start_time = time.time()
+        counts = generate_corpus(args.count, parse_sizes(args.sizes), args.seed, args.givens, args.inequalities,
+                                 args.output, not args.allow_multiple)
+        for name, count in counts.items():
+            print("{} = {:d}".format(name.capitalize(), count))
+        print("Generated {:d} puzzles in {:.2f}s".format(args.count, time.time() - start_time))
+
+    if args.command == "benchmark":
+        run_benchmark(args.corpus, propagation=args.propagation, variable_ordering=args.variable_ordering,
+                      value_ordering=args.value_ordering, engine=args.engine, backjumping_search=args.backjumping)
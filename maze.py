@@ -7,6 +7,11 @@ __email__ = "ty2492"
 import queue
 import resource
 import time
+import heapq
+import collections
+import itertools
+import pickle
+import os
 #=================================#
 #*#*#*# Your code ends here #*#*#*#
 #=================================#
@@ -20,11 +25,20 @@ if __name__ == "__main__":
 	parser.add_argument('-astar', action="store_true", default=False, help="Run A* on the map")
 	parser.add_argument('-ida', action="store_true", default=False, help="Run Iterative Deepening A* on the map")
 	parser.add_argument('-all', action="store_true", default=False, help="Run all the 4 algorithms")
+	parser.add_argument('-hpa', action="store_true", default=False, help="Run hierarchical path planning (HPA*) on the map and compare it with the optimal (BFS) cost")
+	parser.add_argument('-cluster', action="store", type=int, default=10, help="Cluster size for -hpa")
+	parser.add_argument('-sma', action="store_true", default=False, help="Run SMA* on the map within -budget nodes")
+	parser.add_argument('-beam', action="store_true", default=False, help="Run beam search on the map with -width nodes per layer")
+	parser.add_argument('-fbfs', action="store_true", default=False, help="Run frontier-only BFS with divide-and-conquer path reconstruction on the map")
+	parser.add_argument('-budget', action="store", type=int, default=10000, help="Node budget for -sma, and the memory cap for -fbfs")
+	parser.add_argument('-width', action="store", type=int, default=100, help="Beam width for -beam")
+	parser.add_argument('-ch', action="store_true", default=False, help="Answer the query with a contraction hierarchy and compare it with the optimal (BFS) cost")
+	parser.add_argument('-chfile', action="store", default=None, help="File the contraction hierarchy for -ch is loaded from, or saved to if it is missing or out of date")
 	parser.add_argument('-m', action="store", help="Map filename")
 
 	results = parser.parse_args()
 
-	if results.m=="" or not(results.all or results.astar or results.bfs or results.dfs or results.ida):
+	if results.m=="" or not(results.all or results.astar or results.bfs or results.dfs or results.ida or results.hpa or results.sma or results.beam or results.fbfs or results.ch):
 		print("Check the parameters : >> python hw1_UNI.py -h")
 		exit()
 
@@ -505,6 +519,916 @@ def ida(arena):
     # =================================#
 
 
+"""
+Hierarchical path planning (HPA*) for large arenas.
+The arena is split into square clusters. Where two neighbouring clusters share a run of open border cells,
+an entrance (one crossing in the middle of a short run, two at the ends of a long one) becomes a pair of
+abstract nodes, and the distances between the entrances of each cluster are precomputed with a BFS inside it.
+A query links the start and goal to the entrances of their clusters, runs A* over this abstract graph and
+refines every abstract edge back into cells with a BFS inside its cluster.
+"""
+
+
+def is_open(arena, position):
+    row, col = position
+    return 0 <= row < len(arena) and 0 <= col < len(arena[row]) and arena[row][col] != "o"
+
+
+def grid_neighbors(position):
+    row, col = position
+    return ((row - 1, col), (row, col + 1), (row + 1, col), (row, col - 1))
+
+
+class HierarchicalPlanner:
+    """
+    This class stores the abstract graph of an arena for hierarchical path planning:
+    - Clusters (cluster_size x cluster_size blocks of cells, indexed by (row // cluster_size, col // cluster_size))
+    - Transitions (for each pair of neighbouring clusters, the (cell, cell) crossings between them)
+    - Crossings (for each entrance cell, the entrance cells across the border from it)
+    - Intra edges (for each cluster, the BFS distance between every pair of its entrance cells)
+    """
+
+    def __init__(self, arena, cluster_size=10):
+        self.arena = arena
+        self.cluster_size = cluster_size
+        self.rows = len(arena)
+        self.cols = max(len(row) for row in arena) if arena else 0
+        self.transitions = {}
+        self.crossings = {}
+        self.intra_edges = {}
+
+        for cluster in self.clusters():
+            for border in self.borders(cluster):
+                if border[0] == cluster:
+                    self.build_border(border)
+        for cluster in self.clusters():
+            self.build_cluster(cluster)
+
+    def clusters(self):
+        size = self.cluster_size
+        return [(r, c) for r in range((self.rows + size - 1) // size) for c in range((self.cols + size - 1) // size)]
+
+    def cluster_of(self, position):
+        return (position[0] // self.cluster_size, position[1] // self.cluster_size)
+
+    def cluster_bounds(self, cluster):
+        size = self.cluster_size
+        return cluster[0] * size, min((cluster[0] + 1) * size, self.rows), cluster[1] * size, min((cluster[1] + 1) * size, self.cols)
+
+    def borders(self, cluster):
+        """
+        Returns the borders of a cluster with its bottom and right neighbours first, then its top and left
+        neighbours, each as an (upper or left cluster, lower or right cluster) pair
+        """
+        row, col = cluster
+        size = self.cluster_size
+        borders = []
+        if (row + 1) * size < self.rows:
+            borders.append((cluster, (row + 1, col)))
+        if (col + 1) * size < self.cols:
+            borders.append((cluster, (row, col + 1)))
+        if row > 0:
+            borders.append(((row - 1, col), cluster))
+        if col > 0:
+            borders.append(((row, col - 1), cluster))
+        return borders
+
+    def build_border(self, border):
+        """
+        Finds the entrances along one border and records their crossings
+        """
+        for a, b in self.transitions.pop(border, []):
+            self.crossings[a].discard(b)
+            self.crossings[b].discard(a)
+
+        first, second = border
+        top, bottom, left, right = self.cluster_bounds(first)
+        if second[0] != first[0]:
+            pairs = [((bottom - 1, col), (bottom, col)) for col in range(left, right)]
+        else:
+            pairs = [((row, right - 1), (row, right)) for row in range(top, bottom)]
+
+        transitions = []
+        run = []
+        for a, b in pairs + [(None, None)]:
+            if a is not None and is_open(self.arena, a) and is_open(self.arena, b):
+                run.append((a, b))
+                continue
+            if len(run) >= 6:
+                transitions += [run[0], run[-1]]
+            elif run:
+                transitions.append(run[len(run) // 2])
+            run = []
+
+        self.transitions[border] = transitions
+        for a, b in transitions:
+            self.crossings.setdefault(a, set()).add(b)
+            self.crossings.setdefault(b, set()).add(a)
+
+    def entrances(self, cluster):
+        entrances = set()
+        for border in self.borders(cluster):
+            for a, b in self.transitions.get(border, []):
+                entrances.add(a if self.cluster_of(a) == cluster else b)
+        return entrances
+
+    def cluster_bfs(self, source, cluster, targets=None):
+        """
+        Runs BFS from source without leaving cluster.
+        Returns the distance and parent of every reached cell, stopping early once all targets are reached
+        """
+        top, bottom, left, right = self.cluster_bounds(cluster)
+        distance = {source: 0}
+        parent = {source: None}
+        remaining = set(targets) - {source} if targets is not None else None
+        frontier = collections.deque([source])
+        while frontier and remaining != set():
+            position = frontier.popleft()
+            for neighbor in grid_neighbors(position):
+                if neighbor not in distance and top <= neighbor[0] < bottom and left <= neighbor[1] < right \
+                        and is_open(self.arena, neighbor):
+                    distance[neighbor] = distance[position] + 1
+                    parent[neighbor] = position
+                    frontier.append(neighbor)
+                    if remaining is not None:
+                        remaining.discard(neighbor)
+        return distance, parent
+
+    def build_cluster(self, cluster):
+        """
+        Computes the distances between the entrances of one cluster
+        """
+        entrances = self.entrances(cluster)
+        edges = {}
+        for entrance in entrances:
+            distance, _ = self.cluster_bfs(entrance, cluster, entrances)
+            edges[entrance] = {other: distance[other] for other in entrances if other != entrance and other in distance}
+        self.intra_edges[cluster] = edges
+
+    def rebuild(self, arena, changed_positions):
+        """
+        Updates the planner for a new arena that differs from the old one only at changed_positions.
+        Only the borders of the clusters containing a change, and the clusters sharing those borders, are rebuilt.
+        Returns the number of clusters whose intra edges were recomputed
+        """
+        self.arena = arena
+        changed_clusters = {self.cluster_of(position) for position in changed_positions}
+        borders = {border for cluster in changed_clusters for border in self.borders(cluster)}
+        for border in borders:
+            self.build_border(border)
+
+        rebuilt = changed_clusters | {cluster for border in borders for cluster in border}
+        for cluster in rebuilt:
+            self.build_cluster(cluster)
+        return len(rebuilt)
+
+    def find_path(self, start, goal):
+        """
+        Plans a path from start to goal through the abstract graph and refines it into cells.
+        Returns the path as a list of positions from goal back to start (the order of find_path),
+        the number of abstract and refinement nodes expanded, and the most abstract nodes stored at once,
+        or None for the path if goal cannot be reached
+        """
+        start_cluster = self.cluster_of(start)
+        goal_cluster = self.cluster_of(goal)
+        start_distance, _ = self.cluster_bfs(start, start_cluster)
+        goal_distance, _ = self.cluster_bfs(goal, goal_cluster)
+        start_links = {entrance: start_distance[entrance] for entrance in self.entrances(start_cluster) if entrance in start_distance}
+        goal_links = {entrance: goal_distance[entrance] for entrance in self.entrances(goal_cluster) if entrance in goal_distance}
+        if start_cluster == goal_cluster and goal in start_distance:
+            start_links[goal] = start_distance[goal]
+
+        def neighbors(node):
+            links = list(start_links.items()) if node == start else []
+            links += self.intra_edges.get(self.cluster_of(node), {}).get(node, {}).items()
+            links += [(other, 1) for other in self.crossings.get(node, ())]
+            if node in goal_links:
+                links.append((goal, goal_links[node]))
+            return links
+
+        # A* over the abstract graph with the Manhattan distance heuristic
+        def heuristic(node):
+            return abs(node[0] - goal[0]) + abs(node[1] - goal[1])
+
+        cost = {start: 0}
+        parent = {start: None}
+        frontier = [(heuristic(start), start)]
+        closed = set()
+        nodes_expanded, max_nodes_stored = 0, 1
+        while frontier:
+            _, node = heapq.heappop(frontier)
+            if node in closed:
+                continue
+            if node == goal:
+                break
+            closed.add(node)
+            nodes_expanded += 1
+            for other, step in neighbors(node):
+                if other not in closed and cost[node] + step < cost.get(other, float("inf")):
+                    cost[other] = cost[node] + step
+                    parent[other] = node
+                    heapq.heappush(frontier, (cost[other] + heuristic(other), other))
+            max_nodes_stored = max(max_nodes_stored, len(frontier) + len(closed))
+        else:
+            return None, nodes_expanded, max_nodes_stored
+
+        abstract_path = [goal]
+        while parent[abstract_path[-1]] is not None:
+            abstract_path.append(parent[abstract_path[-1]])
+        abstract_path.reverse()
+
+        # Refinement, a crossing is a single step and every other abstract edge stays inside one cluster
+        path = [start]
+        for node, next_node in zip(abstract_path, abstract_path[1:]):
+            if next_node in self.crossings.get(node, ()) and self.cluster_of(node) != self.cluster_of(next_node):
+                path.append(next_node)
+                continue
+            distance, cells = self.cluster_bfs(node, self.cluster_of(node), [next_node])
+            nodes_expanded += len(distance)
+            segment = []
+            position = next_node
+            while position != node:
+                segment.append(position)
+                position = cells[position]
+            path += reversed(segment)
+
+        path.reverse()
+        return path, nodes_expanded, max_nodes_stored
+
+
+"""
+This function runs hierarchical path planning (HPA*) on the input arena (which is a list of str)
+An existing HierarchicalPlanner for the arena may be passed in to skip preprocessing
+Returns the same tuple as astar, the path is near-optimal rather than optimal
+"""
+
+
+def hpa(arena, cluster_size=10, planner=None):
+    start_time = time.time()
+    start_ram = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    initial_state = MazeState(arena)
+    if planner is None:
+        planner = HierarchicalPlanner(arena, cluster_size)
+
+    path, nodes_expanded, max_nodes_stored = planner.find_path(initial_state.start, initial_state.goal)
+    if path is None:
+        return [], -1, -1, -1, -1, -1, -1
+
+    running_time = time.time() - start_time
+    max_ram_usage = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_ram) / (2**10)
+    result_arena = final_arena(arena, path)
+    return result_arena, len(path) - 1, nodes_expanded, max_nodes_stored, len(path) - 1, running_time, max_ram_usage
+
+
+def suboptimality(cost, optimal_cost):
+    """
+    Returns how much longer a path is than the optimal one, as a fraction of the optimal cost
+    """
+    if optimal_cost <= 0:
+        return 0.0
+    return (cost - optimal_cost) / optimal_cost
+
+
+"""
+Memory-bounded searches. These work on SearchNode objects, which hold only what the search needs
+instead of a MazeState with its arena and cached children, and keep the number of nodes stored below a cap.
+"""
+
+
+class SearchNode:
+    """
+    A lightweight search node: position, path cost, f value, depth and parent, plus the bookkeeping of
+    SMA* (children in memory, f values of forgotten children, whether it has been expanded and its key in OPEN)
+    """
+
+    __slots__ = ("position", "cost", "f", "depth", "parent", "children", "forgotten", "expanded", "open_f", "alive")
+
+    def __init__(self, position, cost, f, parent=None):
+        self.position = position
+        self.cost = cost
+        self.f = f
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.parent = parent
+        self.children = set()
+        self.forgotten = {}
+        self.expanded = False
+        self.open_f = None
+        self.alive = True
+
+
+def node_path(node):
+    """
+    Returns the positions from node back to the root, in the order of find_path
+    """
+    path = []
+    while node is not None:
+        path.append(node.position)
+        node = node.parent
+    return path
+
+
+def manhattan(position, goal):
+    return abs(position[0] - goal[0]) + abs(position[1] - goal[1])
+
+
+"""
+This function runs Simplified Memory-bounded A* (SMA*) on the input arena (which is a list of str)
+At most max_nodes nodes are kept. When memory is full the shallowest leaf with the highest f value is forgotten,
+and its parent remembers that f value so that it can regenerate the leaf once it looks best again.
+Only one node per position is kept: a path that reaches a position no more cheaply than a stored node is dropped,
+and a cheaper one replaces the stored node together with everything below it.
+With a budget far below the number of nodes A* would store, regenerating forgotten nodes dominates the run time,
+and with an unreachable goal it can go on for ever, so the search gives up after max_expansions expansions
+(by default 100 per open cell of the arena)
+Returns the same tuple as astar
+"""
+
+
+def sma(arena, max_nodes=10000, max_expansions=None):
+    start_time = time.time()
+    start_ram = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    initial_state = MazeState(arena)
+    goal_position = initial_state.goal
+    infinity = float("inf")
+    counter = itertools.count()
+    if max_expansions is None:
+        max_expansions = 100 * sum(len(row) - row.count("o") for row in arena)
+
+    root = SearchNode(initial_state.start, 0, manhattan(initial_state.start, goal_position))
+    memory = {root.position: root}
+    open_heap = []
+    leaf_heap = []
+
+    def push_open(node, f):
+        node.open_f = f
+        heapq.heappush(open_heap, (f, -node.depth, next(counter), node))
+
+    def push_leaf(node):
+        heapq.heappush(leaf_heap, (-node.f, node.depth, next(counter), node))
+
+    def back_up(node):
+        # An expanded node can be no cheaper than its cheapest child, in memory or forgotten
+        while node is not None and node.expanded:
+            best = min([child.f for child in node.children] + list(node.forgotten.values()), default=infinity)
+            if best <= node.f:
+                break
+            node.f = best
+            if not node.children:
+                push_leaf(node)
+            node = node.parent
+
+    def forget(node):
+        node.alive = False
+        del memory[node.position]
+        parent = node.parent
+        parent.children.discard(node)
+        parent.forgotten[node.position] = min(node.f, parent.forgotten.get(node.position, infinity))
+        best_forgotten = min(parent.forgotten.values())
+        if parent.open_f is None or best_forgotten < parent.open_f:
+            push_open(parent, best_forgotten)
+        if not parent.children:
+            push_leaf(parent)
+        back_up(parent)
+
+    def replace(node):
+        # Drop node and its whole subtree, which hang off a dearer path than the one about to take its place
+        parent = node.parent
+        parent.children.discard(node)
+        stack = [node]
+        while stack:
+            dropped = stack.pop()
+            dropped.alive = False
+            del memory[dropped.position]
+            stack.extend(dropped.children)
+        if not parent.children:
+            push_leaf(parent)
+        back_up(parent)
+
+    def evict():
+        while leaf_heap:
+            key, _, _, node = heapq.heappop(leaf_heap)
+            if node.alive and not node.children and node.parent is not None and -key == node.f:
+                forget(node)
+                return True
+        return False
+
+    push_open(root, root.f)
+    nodes_expanded, max_nodes_stored, max_search_depth = 0, 1, 0
+
+    while open_heap:
+        f, _, _, node = heapq.heappop(open_heap)
+        if not node.alive or node.open_f != f:
+            continue
+        node.open_f = None
+        if f == infinity:
+            break
+
+        if node.position == goal_position:
+            running_time = time.time() - start_time
+            max_ram_usage = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_ram) / (2**10)
+            result_arena = final_arena(arena, node_path(node))
+            return result_arena, node.cost, nodes_expanded, max_nodes_stored, max_search_depth, running_time, max_ram_usage
+
+        if nodes_expanded >= max_expansions:
+            break
+        nodes_expanded += 1
+        if node.expanded:
+            positions = list(node.forgotten)
+        else:
+            positions = [position for position in grid_neighbors(node.position) if is_open(arena, position)]
+            node.expanded = True
+
+        for position in positions:
+            cost = node.cost + 1
+            other = memory.get(position)
+            if other is not None:
+                # A stored path that is at least as cheap (such as the one to the parent) makes this one useless
+                if other.cost <= cost:
+                    node.forgotten.pop(position, None)
+                    continue
+                replace(other)
+
+            backed_up = node.forgotten.pop(position, 0)
+
+            # A path to a non-goal node at the memory limit can never be completed
+            if node.depth + 2 >= max_nodes and position != goal_position:
+                child_f = infinity
+            else:
+                child_f = max(node.f, cost + manhattan(position, goal_position), backed_up)
+            child = SearchNode(position, cost, child_f, node)
+            memory[position] = child
+            node.children.add(child)
+            push_open(child, child_f)
+            push_leaf(child)
+            max_search_depth = max(max_search_depth, child.depth)
+
+        if node.forgotten:
+            push_open(node, max(node.f, min(node.forgotten.values())))
+        elif not node.children:
+            node.f = infinity
+            push_leaf(node)
+        back_up(node)
+
+        while len(memory) > max_nodes and evict():
+            pass
+        max_nodes_stored = max(max_nodes_stored, len(memory))
+
+    return [], -1, -1, -1, -1, -1, -1
+
+
+"""
+This function runs beam search on the input arena (which is a list of str)
+Each layer keeps only the width nodes with the lowest f value, and nodes whose descendants were all
+pruned are released, so at most about width nodes per layer plus their surviving ancestors are stored.
+A node may not return to a position of the previous or current layer. Beam search is neither complete nor optimal
+Returns the same tuple as astar
+"""
+
+
+def beam(arena, width=100):
+    start_time = time.time()
+    start_ram = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    initial_state = MazeState(arena)
+    goal_position = initial_state.goal
+    max_depth = sum(len(row) for row in arena)
+
+    stored = 1
+    nodes_expanded, max_nodes_stored, max_search_depth = 0, 1, 0
+
+    def release(node):
+        nonlocal stored
+        while node is not None and node.alive and not node.children:
+            node.alive = False
+            stored -= 1
+            if node.parent is not None:
+                node.parent.children.discard(node)
+            node = node.parent
+
+    layer = [SearchNode(initial_state.start, 0, manhattan(initial_state.start, goal_position))]
+    previous = set()
+    while layer and layer[0].depth <= max_depth:
+        for node in layer:
+            if node.position == goal_position:
+                running_time = time.time() - start_time
+                max_ram_usage = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_ram) / (2**10)
+                result_arena = final_arena(arena, node_path(node))
+                return result_arena, node.cost, nodes_expanded, max_nodes_stored, max_search_depth, running_time, max_ram_usage
+
+        current = {node.position for node in layer}
+        candidates = []
+        generated = set()
+        for node in layer:
+            nodes_expanded += 1
+            for position in grid_neighbors(node.position):
+                if is_open(arena, position) and position not in previous and position not in current and position not in generated:
+                    generated.add(position)
+                    child = SearchNode(position, node.cost + 1, node.cost + 1 + manhattan(position, goal_position), node)
+                    candidates.append(child)
+                    node.children.add(child)
+        stored += len(candidates)
+        max_nodes_stored = max(max_nodes_stored, stored)
+
+        candidates.sort(key=lambda node: node.f)
+        for node in candidates[width:]:
+            release(node)
+        for node in layer:
+            release(node)
+
+        previous = current
+        layer = candidates[:width]
+        if layer:
+            max_search_depth = max(max_search_depth, layer[0].depth)
+
+    return [], -1, -1, -1, -1, -1, -1
+
+
+"""
+This function runs breadth-first search on the input arena (which is a list of str) storing only its frontier:
+the previous, current and next layers. That is enough to avoid re-expanding nodes on a grid, but leaves no
+parent chain, so the path is rebuilt by divide and conquer: a search that carries, for every node, its ancestor
+at half the goal distance finds a middle cell on a shortest path, and the two halves are solved the same way.
+With max_nodes, the search gives up once the stored layers hold more than max_nodes positions
+Returns the same tuple as astar
+"""
+
+
+def bfs_frontier(arena, max_nodes=None):
+    start_time = time.time()
+    start_ram = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    initial_state = MazeState(arena)
+    nodes_expanded, max_nodes_stored = 0, 1
+
+    def layers(source, target, relay_depth):
+        """
+        Returns the distance from source to target and the ancestor of target at relay_depth,
+        or None if target cannot be reached within the memory cap
+        """
+        nonlocal nodes_expanded, max_nodes_stored
+        previous = {}
+        current = {source: source}
+        depth = 0
+        while current:
+            if target in current:
+                return depth, current[target]
+
+            following = {}
+            for position, relay in current.items():
+                nodes_expanded += 1
+                for neighbor in grid_neighbors(position):
+                    if is_open(arena, neighbor) and neighbor not in previous and neighbor not in current and neighbor not in following:
+                        following[neighbor] = neighbor if depth + 1 == relay_depth else relay
+
+            max_nodes_stored = max(max_nodes_stored, len(previous) + len(current) + len(following))
+            if max_nodes is not None and len(previous) + len(current) + len(following) > max_nodes:
+                return None
+            previous, current = current, following
+            depth += 1
+
+        return None
+
+    def path_between(source, target, distance):
+        # None if a search for a relay exceeds the memory cap
+        if distance <= 1:
+            return [source, target] if distance == 1 else [source]
+        middle = distance // 2
+        result = layers(source, target, middle)
+        if result is None:
+            return None
+        relay = result[1]
+        first = path_between(source, relay, middle)
+        second = path_between(relay, target, distance - middle) if first is not None else None
+        if second is None:
+            return None
+        return first + second[1:]
+
+    result = layers(initial_state.start, initial_state.goal, 0)
+    if result is None:
+        return [], -1, -1, -1, -1, -1, -1
+    distance = result[0]
+    path = path_between(initial_state.start, initial_state.goal, distance)
+    if path is None:
+        return [], -1, -1, -1, -1, -1, -1
+
+    running_time = time.time() - start_time
+    max_ram_usage = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_ram) / (2**10)
+    result_arena = final_arena(arena, path)
+    return result_arena, distance, nodes_expanded, max_nodes_stored, distance, running_time, max_ram_usage
+
+
+"""
+Contraction hierarchy for static arenas that are queried many times.
+Cells with exactly two open neighbours are corridor cells; every other open cell is a graph node, and
+each corridor between two nodes becomes one weighted edge. The nodes are then contracted one by one in
+order of importance, adding a shortcut edge around a contracted node wherever it lay on the only shortest
+path between two of its neighbours. A query runs Dijkstra upwards (towards later contracted nodes) from
+both the start and the goal, and the shortcuts and corridors on the meeting path are unpacked back into cells.
+"""
+
+
+class ContractionHierarchy:
+    """
+    This class stores the contraction hierarchy of an arena:
+    - Corridors (for each corridor, its end nodes and the cells between them, and the corridor of each corridor cell)
+    - Edges (the weight of every original and shortcut edge, in both directions)
+    - Middle (the contracted node a shortcut goes around) and edge cells (the corridor cells of an original edge)
+    - Rank (the contraction order of each node) and up (the edges of each node to nodes of higher rank)
+    """
+
+    # Everything a query needs, which is what save writes and load restores
+    FIELDS = ("arena_key", "nodes", "corridors", "corridor_of", "edges", "middle", "edge_cells", "rank", "up", "shortcuts")
+
+    def __init__(self, arena, witness_limit=100):
+        self.arena_key = arena_key(arena)
+        self.nodes = []
+        self.corridors = []
+        self.corridor_of = {}
+        self.edges = {}
+        self.middle = {}
+        self.edge_cells = {}
+        self.rank = {}
+        self.up = {}
+        self.shortcuts = 0
+
+        self.build_graph(arena)
+        self.contract(witness_limit)
+
+    def build_graph(self, arena):
+        """
+        Finds the nodes and traces the corridors between them into edges
+        """
+        def open_neighbors(position):
+            return [neighbor for neighbor in grid_neighbors(position) if is_open(arena, neighbor)]
+
+        cells = [(row, col) for row in range(len(arena)) for col in range(len(arena[row])) if arena[row][col] != "o"]
+        node_set = {position for position in cells if len(open_neighbors(position)) != 2}
+
+        def trace(node):
+            for first in open_neighbors(node):
+                if first in self.corridor_of or (first in node_set and first < node):
+                    continue
+                previous, position, corridor = node, first, []
+                while position not in node_set:
+                    corridor.append(position)
+                    previous, position = position, next(n for n in open_neighbors(position) if n != previous)
+                self.add_corridor(node, position, corridor)
+
+        for node in node_set:
+            trace(node)
+        # A loop of corridor cells with no node on it gets one of its cells as a node
+        for position in cells:
+            if position not in node_set and position not in self.corridor_of:
+                node_set.add(position)
+                trace(position)
+        self.nodes = sorted(node_set)
+
+    def add_corridor(self, start, end, corridor):
+        """
+        Records a corridor and the edge it gives between its end nodes, keeping the shorter of parallel edges
+        """
+        index = len(self.corridors)
+        self.corridors.append((start, end, corridor))
+        for offset, position in enumerate(corridor):
+            self.corridor_of[position] = (index, offset)
+        if start == end:
+            return
+        weight = len(corridor) + 1
+        if weight < self.edges.get((start, end), float("inf")):
+            self.edges[(start, end)] = self.edges[(end, start)] = weight
+            self.edge_cells[(start, end)] = corridor
+            self.edge_cells[(end, start)] = corridor[::-1]
+
+    def contract(self, witness_limit):
+        """
+        Contracts every node in order of edge difference plus contracted neighbours, updating priorities lazily
+        """
+        graph = {node: {} for node in self.nodes}
+        for (start, end), weight in self.edges.items():
+            graph[start][end] = weight
+        contracted_neighbors = collections.Counter()
+
+        def needed_shortcuts(node):
+            neighbors = list(graph[node].items())
+            shortcuts = []
+            for k, (start, start_weight) in enumerate(neighbors):
+                targets = {end: start_weight + end_weight for end, end_weight in neighbors[k + 1:]}
+                if not targets:
+                    continue
+                distance = self.witness_search(graph, start, node, max(targets.values()), witness_limit)
+                for end, weight in targets.items():
+                    if distance.get(end, float("inf")) > weight:
+                        shortcuts.append((start, end, weight))
+            return shortcuts
+
+        def priority(node):
+            return len(needed_shortcuts(node)) - len(graph[node]) + contracted_neighbors[node]
+
+        heap = [(priority(node), node) for node in self.nodes]
+        heapq.heapify(heap)
+        while heap:
+            _, node = heapq.heappop(heap)
+            current = priority(node)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, node))
+                continue
+
+            self.rank[node] = len(self.rank)
+            for start, end, weight in needed_shortcuts(node):
+                if weight < graph[start].get(end, float("inf")):
+                    graph[start][end] = graph[end][start] = weight
+                    self.edges[(start, end)] = self.edges[(end, start)] = weight
+                    self.middle[(start, end)] = self.middle[(end, start)] = node
+                    self.shortcuts += 1
+            for neighbor in graph[node]:
+                del graph[neighbor][node]
+                contracted_neighbors[neighbor] += 1
+            del graph[node]
+
+        self.up = {node: [] for node in self.nodes}
+        for (start, end), weight in self.edges.items():
+            if self.rank[end] > self.rank[start]:
+                self.up[start].append((end, weight))
+
+    @staticmethod
+    def witness_search(graph, source, excluded, max_distance, limit):
+        """
+        Dijkstra from source around excluded, stopping past max_distance or after limit settled nodes.
+        A missed witness only costs an unneeded shortcut, never a wrong distance
+        """
+        distance = {source: 0}
+        frontier = [(0, source)]
+        settled = 0
+        while frontier and settled < limit:
+            cost, node = heapq.heappop(frontier)
+            if cost > distance[node]:
+                continue
+            if cost > max_distance:
+                break
+            settled += 1
+            for neighbor, weight in graph[node].items():
+                if neighbor != excluded and cost + weight < distance.get(neighbor, float("inf")):
+                    distance[neighbor] = cost + weight
+                    heapq.heappush(frontier, (cost + weight, neighbor))
+        return distance
+
+    def entry_points(self, position):
+        """
+        Returns the nodes a position reaches without passing another node, each with its distance and the
+        cells from position up to the node (excluding the node)
+        """
+        if position in self.rank:
+            return {position: (0, [])}
+        index, offset = self.corridor_of[position]
+        start, end, corridor = self.corridors[index]
+        points = {start: (offset + 1, corridor[offset::-1])}
+        if end not in points or len(corridor) - offset < points[end][0]:
+            points[end] = (len(corridor) - offset, corridor[offset:])
+        return points
+
+    def unpack(self, start, end):
+        """
+        Returns the cells strictly between two nodes along an edge, expanding shortcuts recursively
+        """
+        cells = []
+        stack = [(start, end)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item[0], int):
+                cells.append(item)
+                continue
+            first, second = item
+            if (first, second) in self.middle:
+                node = self.middle[(first, second)]
+                stack += [(node, second), node, (first, node)]
+            else:
+                cells += self.edge_cells[(first, second)]
+        return cells
+
+    def find_path(self, start, goal):
+        """
+        Answers a query with a bidirectional upward Dijkstra.
+        Returns the path as a list of positions from goal back to start (the order of find_path),
+        the number of nodes settled and the most nodes stored at once, or None for the path if goal cannot be reached
+        """
+        if start == goal:
+            return [start], 0, 1
+
+        start_points = self.entry_points(start)
+        goal_points = self.entry_points(goal)
+        best, meeting = float("inf"), None
+
+        # Start and goal in the same corridor can be joined without leaving it
+        if start in self.corridor_of and goal in self.corridor_of and self.corridor_of[start][0] == self.corridor_of[goal][0]:
+            index, start_offset = self.corridor_of[start]
+            goal_offset = self.corridor_of[goal][1]
+            corridor = self.corridors[index][2]
+            best = abs(goal_offset - start_offset)
+            step = 1 if goal_offset >= start_offset else -1
+            direct_path = corridor[start_offset:goal_offset + step if goal_offset + step >= 0 else None:step]
+
+        distance = ({node: cost for node, (cost, _) in start_points.items()},
+                    {node: cost for node, (cost, _) in goal_points.items()})
+        parent = ({node: None for node in start_points}, {node: None for node in goal_points})
+        frontier = ([(cost, node) for node, cost in distance[0].items()], [(cost, node) for node, cost in distance[1].items()])
+        settled = (set(), set())
+        for side in (0, 1):
+            heapq.heapify(frontier[side])
+            for node, cost in distance[side].items():
+                if node in distance[1 - side] and cost + distance[1 - side][node] < best:
+                    best, meeting = cost + distance[1 - side][node], node
+
+        nodes_expanded, max_nodes_stored = 0, len(frontier[0]) + len(frontier[1])
+        side = 0
+        while (frontier[0] and frontier[0][0][0] < best) or (frontier[1] and frontier[1][0][0] < best):
+            if not (frontier[side] and frontier[side][0][0] < best):
+                side = 1 - side
+            cost, node = heapq.heappop(frontier[side])
+            if node in settled[side] or cost > distance[side][node]:
+                side = 1 - side
+                continue
+            settled[side].add(node)
+            nodes_expanded += 1
+            for neighbor, weight in self.up[node]:
+                if cost + weight < distance[side].get(neighbor, float("inf")):
+                    distance[side][neighbor] = cost + weight
+                    parent[side][neighbor] = node
+                    heapq.heappush(frontier[side], (cost + weight, neighbor))
+                    if neighbor in distance[1 - side] and cost + weight + distance[1 - side][neighbor] < best:
+                        best, meeting = cost + weight + distance[1 - side][neighbor], neighbor
+            max_nodes_stored = max(max_nodes_stored, len(frontier[0]) + len(frontier[1]) + len(settled[0]) + len(settled[1]))
+            side = 1 - side
+
+        if best == float("inf"):
+            return None, nodes_expanded, max_nodes_stored
+        if meeting is None:
+            return direct_path[::-1], nodes_expanded, max_nodes_stored
+
+        chains = []
+        for side in (0, 1):
+            chain = [meeting]
+            while parent[side][chain[-1]] is not None:
+                chain.append(parent[side][chain[-1]])
+            chains.append(chain)
+        nodes = chains[0][::-1] + chains[1][1:]
+
+        path = start_points[nodes[0]][1]
+        for node, next_node in zip(nodes, nodes[1:]):
+            path += [node] + self.unpack(node, next_node)
+        path += [nodes[-1]] + goal_points[nodes[-1]][1][::-1]
+
+        path.reverse()
+        return path, nodes_expanded, max_nodes_stored
+
+    def save(self, filename):
+        # Plain dicts, lists and tuples only, so a file written by maze.py run as a script loads in any importer
+        with open(filename, "wb") as f:
+            pickle.dump({field: getattr(self, field) for field in self.FIELDS}, f, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as f:
+            data = pickle.load(f)
+        hierarchy = cls.__new__(cls)
+        for field in cls.FIELDS:
+            setattr(hierarchy, field, data[field])
+        return hierarchy
+
+
+def arena_key(arena):
+    """
+    Returns the obstacle layout of an arena, which is all a contraction hierarchy depends on
+    """
+    return "\n".join("".join("o" if char == "o" else "." for char in row) for row in arena)
+
+
+"""
+This function answers a query on the input arena (which is a list of str) with a contraction hierarchy
+An existing ContractionHierarchy for the arena may be passed in to skip preprocessing
+Returns the same tuple as astar, the path is optimal
+"""
+
+
+def ch(arena, hierarchy=None):
+    start_time = time.time()
+    start_ram = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    initial_state = MazeState(arena)
+    if hierarchy is None:
+        hierarchy = ContractionHierarchy(arena)
+
+    path, nodes_expanded, max_nodes_stored = hierarchy.find_path(initial_state.start, initial_state.goal)
+    if path is None:
+        return [], -1, -1, -1, -1, -1, -1
+
+    running_time = time.time() - start_time
+    max_ram_usage = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_ram) / (2**10)
+    result_arena = final_arena(arena, path)
+    return result_arena, len(path) - 1, nodes_expanded, max_nodes_stored, len(path) - 1, running_time, max_ram_usage
+
+
 if __name__ == "__main__":
     if results.bfs:
         print("\nBFS algorithm called")
@@ -585,3 +1509,127 @@ if __name__ == "__main__":
         print("Max Search Depth: " + str(ida_max_search_depth))
         print("Time: " + str(ida_time) + "s")
         print("RAM Usage: " + str(ida_ram) + "kB\n")
+
+    if results.hpa:
+        print("\nHierarchical path planning called")
+        preprocess_start = time.time()
+        planner = HierarchicalPlanner(arena, results.cluster)
+        preprocess_time = time.time() - preprocess_start
+        (
+            hpa_arena,
+            hpa_cost,
+            hpa_nodes_expanded,
+            hpa_max_nodes_stored,
+            hpa_max_search_depth,
+            hpa_time,
+            hpa_ram,
+        ) = hpa(arena, planner=planner)
+        print("\n".join(hpa_arena))
+        print("HPA*:")
+        print("Cost: " + str(hpa_cost))
+        print("Nodes Expanded: " + str(hpa_nodes_expanded))
+        print("Max Nodes Stored: " + str(hpa_max_nodes_stored))
+        print("Max Search Depth: " + str(hpa_max_search_depth))
+        print("Preprocessing Time: " + str(preprocess_time) + "s")
+        print("Time: " + str(hpa_time) + "s")
+        print("RAM Usage: " + str(hpa_ram) + "kB")
+        # A* with this heuristic is not always optimal, so the reference is the BFS cost
+        if not results.bfs:
+            bfs_cost = bfs(arena)[1]
+        print("Suboptimality vs optimal (BFS): {:.2%}\n".format(suboptimality(hpa_cost, bfs_cost)))
+
+    if results.sma:
+        print("\nSMA* algorithm called")
+        (
+            sma_arena,
+            sma_cost,
+            sma_nodes_expanded,
+            sma_max_nodes_stored,
+            sma_max_search_depth,
+            sma_time,
+            sma_ram,
+        ) = sma(arena, results.budget)
+        print("\n".join(sma_arena))
+        print("SMA*:")
+        print("Cost: " + str(sma_cost))
+        print("Nodes Expanded: " + str(sma_nodes_expanded))
+        print("Max Nodes Stored: " + str(sma_max_nodes_stored))
+        print("Max Search Depth: " + str(sma_max_search_depth))
+        print("Time: " + str(sma_time) + "s")
+        print("RAM Usage: " + str(sma_ram) + "kB\n")
+
+    if results.beam:
+        print("\nBeam search algorithm called")
+        (
+            beam_arena,
+            beam_cost,
+            beam_nodes_expanded,
+            beam_max_nodes_stored,
+            beam_max_search_depth,
+            beam_time,
+            beam_ram,
+        ) = beam(arena, results.width)
+        print("\n".join(beam_arena))
+        print("Beam Search:")
+        print("Cost: " + str(beam_cost))
+        print("Nodes Expanded: " + str(beam_nodes_expanded))
+        print("Max Nodes Stored: " + str(beam_max_nodes_stored))
+        print("Max Search Depth: " + str(beam_max_search_depth))
+        print("Time: " + str(beam_time) + "s")
+        print("RAM Usage: " + str(beam_ram) + "kB\n")
+
+    if results.fbfs:
+        print("\nFrontier BFS algorithm called")
+        (
+            fbfs_arena,
+            fbfs_cost,
+            fbfs_nodes_expanded,
+            fbfs_max_nodes_stored,
+            fbfs_max_search_depth,
+            fbfs_time,
+            fbfs_ram,
+        ) = bfs_frontier(arena, results.budget)
+        print("\n".join(fbfs_arena))
+        print("Frontier BFS:")
+        print("Cost: " + str(fbfs_cost))
+        print("Nodes Expanded: " + str(fbfs_nodes_expanded))
+        print("Max Nodes Stored: " + str(fbfs_max_nodes_stored))
+        print("Max Search Depth: " + str(fbfs_max_search_depth))
+        print("Time: " + str(fbfs_time) + "s")
+        print("RAM Usage: " + str(fbfs_ram) + "kB\n")
+
+    if results.ch:
+        print("\nContraction hierarchy called")
+        preprocess_start = time.time()
+        hierarchy = None
+        if results.chfile is not None and os.path.exists(results.chfile):
+            hierarchy = ContractionHierarchy.load(results.chfile)
+            if hierarchy.arena_key != arena_key(arena):
+                hierarchy = None
+        if hierarchy is None:
+            hierarchy = ContractionHierarchy(arena)
+            if results.chfile is not None:
+                hierarchy.save(results.chfile)
+        preprocess_time = time.time() - preprocess_start
+        (
+            ch_arena,
+            ch_cost,
+            ch_nodes_expanded,
+            ch_max_nodes_stored,
+            ch_max_search_depth,
+            ch_time,
+            ch_ram,
+        ) = ch(arena, hierarchy)
+        print("\n".join(ch_arena))
+        print("Contraction Hierarchy:")
+        print("Cost: " + str(ch_cost))
+        print("Nodes Expanded: " + str(ch_nodes_expanded))
+        print("Max Nodes Stored: " + str(ch_max_nodes_stored))
+        print("Max Search Depth: " + str(ch_max_search_depth))
+        print("Graph Nodes: " + str(len(hierarchy.nodes)) + ", Shortcuts: " + str(hierarchy.shortcuts))
+        print("Preprocessing Time: " + str(preprocess_time) + "s")
+        print("Time: " + str(ch_time) + "s")
+        print("RAM Usage: " + str(ch_ram) + "kB")
+        if not results.bfs and not results.hpa:
+            bfs_cost = bfs(arena)[1]
+        print("Suboptimality vs optimal (BFS): {:.2%}\n".format(suboptimality(ch_cost, bfs_cost)))
@@ -0,0 +1,262 @@
+"""
+Asyncio path planning server for maze.py over a Unix socket.
+
+Start it with:
+$python3 maze_server.py --socket /tmp/maze.sock --workers 4
+
+Clients send one JSON request per line and get one JSON response per line:
+{"map": "arena.txt", "algorithm": "astar", "start": [0, 0], "goal": [29, 39]}
+start and goal are optional and default to the s and g cells of the map.
+{"metrics": true} returns the queue depth, cache and coalescing counters and latency percentiles instead.
+
+Arenas are read once per file (and again only if the file changes). Identical requests that arrive while
+one is being searched share its result, finished results are kept in an LRU cache, and searches run in a
+process pool so the event loop keeps accepting requests.
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import socket
+import time
+
+import maze
+
+ALGORITHMS = {
+    "bfs": maze.bfs,
+    "dfs": maze.dfs,
+    "astar": maze.astar,
+    "ida": maze.ida,
+    "hpa": maze.hpa,
+    "sma": maze.sma,
+    "beam": maze.beam,
+    "fbfs": maze.bfs_frontier,
+    "ch": maze.ch,
+}
+
+# Arenas, HPA* planners and contraction hierarchies loaded by this worker process, keyed by (filename, modification time)
+ARENAS = {}
+PLANNERS = {}
+HIERARCHIES = {}
+
+
+def load_arena(filename, mtime):
+    """
+    Returns the arena of a map file as a list of str, reading it only once per modification time.
+    Everything cached for older versions of the file is dropped when it changes
+    """
+    key = (filename, mtime)
+    arena = ARENAS.get(key)
+    if arena is None:
+        for cache in (ARENAS, PLANNERS, HIERARCHIES):
+            for stale in [stale for stale in cache if stale[0] == filename]:
+                del cache[stale]
+        with open(filename) as f:
+            arena = f.read().split("\n")
+        ARENAS[key] = arena
+    return arena
+
+
+def with_endpoints(arena, start, goal):
+    """
+    Returns the arena with its s and g cells moved to start and goal, when given.
+    Raises ValueError if start or goal is not an open cell of the arena
+    """
+    if start is None and goal is None:
+        return arena
+
+    for name, position in (("start", start), ("goal", goal)):
+        if position is not None and not (len(position) == 2 and 0 <= position[0] < len(arena)
+                                         and 0 <= position[1] < len(arena[position[0]])):
+            raise ValueError(name + " " + json.dumps(list(position)) + " is outside the map")
+        if position is not None and arena[position[0]][position[1]] == "o":
+            raise ValueError(name + " " + json.dumps(list(position)) + " is an obstacle")
+
+    rows = [list(row) for row in arena]
+    for row in rows:
+        for col, char in enumerate(row):
+            if (char == "s" and start is not None) or (char == "g" and goal is not None):
+                row[col] = "."
+    if start is not None:
+        rows[start[0]][start[1]] = "s"
+    if goal is not None:
+        rows[goal[0]][goal[1]] = "g"
+    return ["".join(row) for row in rows]
+
+
+def run_query(filename, mtime, start, goal, algorithm):
+    """
+    Runs one search in a worker process.
+    Returns the response fields: the solved arena, the cost and the search statistics
+    """
+    map_arena = load_arena(filename, mtime)
+    arena = with_endpoints(map_arena, start, goal)
+    # The planner and the hierarchy only depend on the obstacles, so they are built from the map itself and shared
+    # by every start and goal on it
+    if algorithm == "hpa":
+        planner = PLANNERS.get((filename, mtime))
+        if planner is None:
+            planner = PLANNERS[(filename, mtime)] = maze.HierarchicalPlanner(map_arena)
+        result = maze.hpa(arena, planner=planner)
+    elif algorithm == "ch":
+        hierarchy = HIERARCHIES.get((filename, mtime))
+        if hierarchy is None:
+            hierarchy = HIERARCHIES[(filename, mtime)] = maze.ContractionHierarchy(map_arena)
+        result = maze.ch(arena, hierarchy)
+    else:
+        result = ALGORITHMS[algorithm](arena)
+
+    result_arena, cost, nodes_expanded, max_nodes_stored, max_search_depth, running_time, ram = result
+    return {"arena": result_arena, "cost": cost, "nodes_expanded": nodes_expanded, "max_nodes_stored": max_nodes_stored,
+            "max_search_depth": max_search_depth, "time": running_time, "ram": ram}
+
+
+class MazeServer:
+    """
+    This class holds the state of the server:
+    - Executor (the process pool that runs the searches)
+    - In flight (tasks of the searches running now, keyed by request, shared by identical requests)
+    - Cache (the most recent cache_size results, least recently used first)
+    - Metrics (counters, and the latencies of the last latency_window requests)
+    """
+
+    def __init__(self, workers=None, cache_size=1024, latency_window=10000):
+        self.executor = concurrent.futures.ProcessPoolExecutor(workers)
+        self.in_flight = {}
+        self.cache = collections.OrderedDict()
+        self.cache_size = cache_size
+        self.latencies = collections.deque(maxlen=latency_window)
+        self.counters = collections.Counter()
+
+    async def solve(self, request):
+        """
+        Answers one query from the cache, by joining an identical search in flight, or by starting a search
+        """
+        filename = os.path.abspath(request["map"])
+        mtime = os.stat(filename).st_mtime_ns
+        start = tuple(request["start"]) if request.get("start") is not None else None
+        goal = tuple(request["goal"]) if request.get("goal") is not None else None
+        algorithm = request.get("algorithm", "astar")
+        if algorithm not in ALGORITHMS:
+            raise ValueError("Unknown algorithm " + algorithm)
+        key = (filename, mtime, start, goal, algorithm)
+
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+            self.counters["cache_hits"] += 1
+            return result
+
+        # The search runs in a task of its own, so a client that disconnects does not cancel it for the others
+        task = self.in_flight.get(key)
+        if task is None:
+            task = self.in_flight[key] = asyncio.ensure_future(self.search(key))
+            self.counters["searches"] += 1
+        else:
+            self.counters["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def search(self, key):
+        """
+        Runs one search in the process pool and caches its result
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor, run_query, *key)
+        finally:
+            del self.in_flight[key]
+
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def metrics(self):
+        """
+        Returns the queue depth (searches submitted and not finished), the counters and the latency percentiles in ms
+        """
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+        metrics = {"queue_depth": len(self.in_flight), "cache_size": len(self.cache)}
+        metrics.update(self.counters)
+        metrics.update({"latency_p50_ms": percentile(50), "latency_p90_ms": percentile(90),
+                        "latency_p99_ms": percentile(99), "latency_max_ms": latencies[-1] * 1000 if latencies else 0.0})
+        return metrics
+
+    async def handle(self, reader, writer):
+        """
+        Serves one client connection, one JSON request per line
+        """
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+
+            start_time = time.perf_counter()
+            request = None
+            try:
+                request = json.loads(line)
+                if request.get("metrics"):
+                    response = self.metrics()
+                else:
+                    response = dict(await self.solve(request))
+                    self.counters["requests"] += 1
+                    self.latencies.append(time.perf_counter() - start_time)
+            except Exception as error:
+                self.counters["errors"] += 1
+                response = {"error": str(error)}
+
+            if isinstance(request, dict) and "id" in request:
+                response["id"] = request["id"]
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+        writer.close()
+
+    async def serve(self, path):
+        """
+        Listens on a Unix socket at path until cancelled
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        server = await asyncio.start_unix_server(self.handle, path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def query(path, request):
+    """
+    Sends one request to a running server and returns its response, for clients that do not use asyncio
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall((json.dumps(request) + "\n").encode())
+        with client.makefile("rb") as f:
+            return json.loads(f.readline())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Path planning server for maze.py')
+    parser.add_argument('--socket', default="/tmp/maze.sock", help="Unix socket path")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--cache-size', type=int, default=1024, help="Number of results kept in the LRU cache")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(MazeServer(args.workers, args.cache_size).serve(args.socket))
+    except KeyboardInterrupt:
+        pass
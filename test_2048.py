@@ -0,0 +1,128 @@
+"""
+Tests of the 2048 agent's in-place search and search statistics, on a stub grid so that the game framework
+(BaseAI, Grid) is not needed.
+
+Run with:
+$python3 -m pytest test_2048.py
+"""
+import csv
+import importlib.util
+import json
+import os
+
+# The module name starts with a digit, so it cannot be imported with an import statement
+spec = importlib.util.spec_from_file_location("game_2048", os.path.join(os.path.dirname(os.path.abspath(__file__)), "2048.py"))
+game_2048 = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(game_2048)
+
+BOARD = [[2, 2, 4, 0],
+         [0, 4, 4, 8],
+         [2, 0, 0, 2],
+         [16, 8, 2, 0]]
+
+
+class StubGrid:
+    '''
+    The parts of the game's Grid that the agent uses, with moves done the straightforward way
+    '''
+
+    def __init__(self, board):
+        self.size = len(board)
+        self.map = [list(row) for row in board]
+
+    def getAvailableCells(self):
+        return [(i, j) for i in range(self.size) for j in range(self.size) if self.map[i][j] == 0]
+
+    def getMaxTile(self):
+        return max(max(row) for row in self.map)
+
+    def canMove(self):
+        return any(self.moved(move) != self.map for move in range(4))
+
+    # Board after a move (0 up, 1 down, 2 left, 3 right), found by sliding every line to the left
+    def moved(self, move):
+        n = self.size
+        board = [list(row) for row in self.map]
+        if move < 2:
+            board = [list(column) for column in zip(*board)]
+        if move in (1, 3):
+            board = [row[::-1] for row in board]
+
+        for i, row in enumerate(board):
+            tiles, merged = [value for value in row if value], []
+            while tiles:
+                if len(tiles) > 1 and tiles[0] == tiles[1]:
+                    merged.append(tiles[0] * 2)
+                    tiles = tiles[2:]
+                else:
+                    merged.append(tiles.pop(0))
+            board[i] = merged + [0] * (n - len(merged))
+
+        if move in (1, 3):
+            board = [row[::-1] for row in board]
+        if move < 2:
+            board = [list(column) for column in zip(*board)]
+        return board
+
+
+def make_agent(stats=None):
+    agent = game_2048.IntelligentAgent(weights=game_2048.DEFAULT_WEIGHTS, stats=stats)
+    agent.opening_book = None
+    agent.time_limit = float("inf")
+    agent.depth_limit = 3
+    return agent
+
+
+def test_make_and_unmake_restore_the_board():
+    agent = make_agent()
+    grid = StubGrid(BOARD)
+    for move in range(4):
+        expected = grid.moved(move)
+        assert agent.make_move(grid, move) == (expected != BOARD)
+        assert grid.map == expected
+        agent.unmake_move(grid)
+        assert grid.map == BOARD and not agent.undo_stack
+
+    # A move that changes nothing leaves nothing on the undo stack
+    grid = StubGrid([[2, 0, 0, 0], [4, 0, 0, 0], [8, 0, 0, 0], [16, 0, 0, 0]])
+    assert not agent.make_move(grid, 0) and not agent.undo_stack
+
+
+def test_in_place_search_restores_the_grid():
+    grid = StubGrid(BOARD)
+    agent = make_agent()
+    move = agent.getMove(grid)
+    assert grid.map == BOARD and not agent.undo_stack
+    assert move in [move for move in range(4) if grid.moved(move) != BOARD]
+
+
+def test_search_stats_count_nodes_and_write_records(tmp_path):
+    stats = game_2048.SearchStats()
+    stats.new_game(7)
+    agent = make_agent(stats)
+    grid = StubGrid(BOARD)
+    for _ in range(2):
+        agent.getMove(grid)
+
+    assert len(stats.records) == 2
+    record = stats.records[0]
+    assert record["game"] == 7 and [record["move"] for record in stats.records] == [0, 1]
+    # The root is never cut off, so every legal move gets an AI node
+    assert record["nodes_per_depth"][:2] == [1, len([move for move in range(4) if grid.moved(move) != BOARD])]
+    assert record["nodes"] == sum(record["nodes_per_depth"]) and record["max_depth"] == agent.depth_limit
+    assert stats.summary()["nodes"] == sum(record["nodes"] for record in stats.records)
+    assert stats.summary()["cutoffs"] == sum(record["cutoffs"] for record in stats.records)
+    # Per-move move ordering counts add up to the agent's running totals
+    assert stats.summary()["max_nodes_ordered"] == agent.max_nodes_ordered > 0
+    assert stats.summary()["first_move_best"] == agent.first_move_best
+    assert stats.summary()["first_move_best_rate"] == agent.first_move_best_rate()
+
+    stats.dump(str(tmp_path / "stats.jsonl"))
+    with open(tmp_path / "stats.jsonl") as f:
+        assert [json.loads(line) for line in f] == stats.records
+
+    stats.dump(str(tmp_path / "stats.csv"))
+    with open(tmp_path / "stats.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 2
+    assert [int(rows[0]["depth_{:d}".format(ply)]) for ply in range(len(record["nodes_per_depth"]))] == record["nodes_per_depth"]
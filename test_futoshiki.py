@@ -0,0 +1,182 @@
+"""
+Cross-checks of the futoshiki search engines on seeded generator boards.
+
+Run with:
+$python3 -m pytest test_futoshiki.py
+"""
+import io
+import itertools
+import random
+
+from cdcl import CDCLSolver, luby
+from futoshiki import (Board, get_layout, solve_board, count_solutions, calculate_inequality, get_symmetries,
+                       transform_values, canonical_form, solve_batch, SolutionCache, DIGITS, FLIPPED_INEQUALITY)
+from futoshiki_generator import generate_puzzle
+
+
+def is_solution(config_string, solved_string, n):
+    '''
+    Checks that solved_string fills every cell of config_string, keeps its givens and satisfies
+    every row, column and inequality constraint
+    '''
+    layout = get_layout(n)
+    values = [int(solved_string[position]) for position in layout["cells"]]
+    givens = [int(config_string[position]) for position in layout["cells"]]
+    if any(given and given != value for given, value in zip(givens, values)):
+        return False
+    if any(sorted(values[i] for i in unit) != list(range(1, n + 1)) for unit in layout["units"]):
+        return False
+    return all(config_string[position] == '-' or calculate_inequality(values[i], config_string[position], values[j])
+               for position, i, j in layout["inequalities"])
+
+
+def random_boards(count, seed, unique):
+    '''
+    Generator boards with a unique solution, or with random givens and inequalities that need not
+    be consistent, so that some have no solution
+    '''
+    rng = random.Random(seed)
+    boards = []
+    for _ in range(count):
+        n = rng.choice([4, 5, 6])
+        if unique:
+            boards.append(generate_puzzle(n, rng))
+            continue
+
+        config_string = list(generate_puzzle(n, rng, given_fraction=0.15, inequality_fraction=0.2, unique=False))
+        layout = get_layout(n)
+        for position in rng.sample(layout["cells"], 2):
+            config_string[position] = str(rng.randint(1, n))
+        for position, _, _ in rng.sample(layout["inequalities"], 3):
+            config_string[position] = rng.choice("<>")
+        boards.append(''.join(config_string))
+    return boards
+
+
+def symmetric_variants(config_string):
+    '''
+    The config strings of a board under each of its 16 symmetries, moving and flipping the givens and
+    inequalities the way canonical_form does
+    '''
+    n = Board.get_board_dim(len(config_string))
+    layout = get_layout(n)
+    positions = {(i, j): position for position, i, j in layout["inequalities"]}
+    values = [int(config_string[position]) for position in layout["cells"]]
+
+    variants = []
+    for symmetry in get_symmetries(n):
+        perm, invert = symmetry
+        chars = ['-'] * len(config_string)
+        for position, value in zip(layout["cells"], transform_values(values, n, symmetry)):
+            chars[position] = DIGITS[value]
+        for position, i, j in layout["inequalities"]:
+            inequality = config_string[position]
+            if inequality == '-':
+                continue
+            a, b = perm[i], perm[j]
+            if invert:
+                inequality = FLIPPED_INEQUALITY[inequality]
+            if a > b:
+                a, b = b, a
+                inequality = FLIPPED_INEQUALITY[inequality]
+            chars[positions[(a, b)]] = inequality
+        variants.append(''.join(chars))
+    return variants
+
+
+def solve(config_string, **options):
+    solved_board, _ = solve_board(Board(config_string), **options)
+    return solved_board.get_config_str() if solved_board else None
+
+
+def test_luby_sequence():
+    assert [luby(i) for i in range(1, 16)] == [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8]
+
+
+def test_cdcl_matches_brute_force():
+    rng = random.Random(1)
+    for _ in range(200):
+        n = rng.randint(3, 10)
+        clauses = [[rng.choice([-1, 1]) * rng.randint(1, n) for _ in range(3)] for _ in range(int(n * rng.uniform(3, 6)))]
+        expected = any(all(any((literal > 0) == bits[abs(literal) - 1] for literal in clause) for clause in clauses)
+                       for bits in itertools.product([False, True], repeat=n))
+
+        solver = CDCLSolver(restart_base=2)
+        for _ in range(n):
+            solver.new_var()
+        for clause in clauses:
+            solver.add_clause(clause)
+        assert solver.solve() == expected
+        if expected:
+            assert all(any((literal > 0) == solver.model_value(abs(literal)) for literal in clause) for clause in clauses)
+
+
+def test_sat_matches_backtracking_on_unique_boards():
+    for config_string in random_boards(20, 0, unique=True):
+        n = Board.get_board_dim(len(config_string))
+        expected = solve(config_string, propagation="alldiff")
+        assert expected is not None and is_solution(config_string, expected, n)
+        assert solve(config_string, engine="sat") == expected
+
+
+def test_sat_matches_backtracking_on_unsatisfiable_boards():
+    unsatisfiable = 0
+    for config_string in random_boards(40, 1, unique=False):
+        n = Board.get_board_dim(len(config_string))
+        expected = solve(config_string, propagation="fc")
+        sat = solve(config_string, engine="sat")
+        assert (sat is None) == (expected is None) == (count_solutions(Board(config_string), 1) == 0)
+        if expected is None:
+            unsatisfiable += 1
+        else:
+            assert is_solution(config_string, expected, n) and is_solution(config_string, sat, n)
+    assert unsatisfiable > 0
+
+
+def test_backjumping_matches_backtracking():
+    boards = random_boards(20, 2, unique=True) + random_boards(60, 3, unique=False)
+    for propagation in ("fc", "ac3", "alldiff"):
+        solvable = 0
+        for config_string in boards:
+            n = Board.get_board_dim(len(config_string))
+            expected = solve(config_string, propagation=propagation)
+            found = solve(config_string, propagation=propagation, backjumping_search=True)
+            count = count_solutions(Board(config_string), None)
+            assert (found is None) == (expected is None) == (count == 0)
+            if count == 1:
+                assert found == expected
+            if found is not None:
+                assert is_solution(config_string, found, n)
+                solvable += 1
+        assert 0 < solvable < len(boards)
+
+
+def test_cache_maps_solutions_back_to_symmetric_variants():
+    for config_string in random_boards(5, 4, unique=True):
+        n = Board.get_board_dim(len(config_string))
+        variants = symmetric_variants(config_string)
+        assert len({canonical_form(Board(variant))[0] for variant in variants}) == 1
+
+        cache = SolutionCache()
+        for index, variant in enumerate(variants):
+            board = Board(variant)
+            solved_board, _ = solve_board(board, cache=cache)
+            assert board.stats["cache_hits" if index else "cache_misses"] == 1
+            assert solved_board.get_config_str() == solve(variant)
+            assert is_solution(variant, solved_board.get_config_str(), n)
+        assert len(cache.entries) == 1
+
+
+def test_parallel_batch_shares_the_cache_file(tmp_path):
+    config_strings = random_boards(6, 5, unique=True)
+    config_strings += [symmetric_variants(config_string)[5] for config_string in config_strings]
+    expected = [solve(config_string) for config_string in config_strings]
+
+    for run in range(2):
+        cache = SolutionCache(str(tmp_path / "solutions"))
+        outfile = io.StringIO()
+        _, board_stats = solve_batch(config_strings, outfile, 2, cache=cache)
+        cache.close()
+        assert outfile.getvalue().split() == expected
+        hits = sum(stats.get("cache_hits", 0) for stats in board_stats)
+        assert hits == len(config_strings) if run else hits < len(config_strings)
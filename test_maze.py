@@ -0,0 +1,134 @@
+"""
+Cross-checks of the maze search algorithms against breadth first search on seeded random arenas.
+
+Run with:
+$python3 -m pytest test_maze.py
+"""
+import collections
+import random
+import subprocess
+import sys
+
+import maze
+
+
+def random_arena(seed, rows=30, cols=40, density=0.25):
+    '''
+    Arena with random obstacles and a few long walls with gaps, s in the top left and g in the bottom right
+    '''
+    rng = random.Random(seed)
+    grid = [['o' if rng.random() < density else '.' for _ in range(cols)] for _ in range(rows)]
+    for _ in range(rows // 10):
+        row, gap = rng.randrange(2, rows - 2), rng.randrange(cols)
+        for col in range(cols):
+            if abs(col - gap) > 2:
+                grid[row][col] = 'o'
+            else:
+                grid[row - 1][col] = grid[row][col] = grid[row + 1][col] = '.'
+    grid[0][1] = grid[1][0] = grid[rows - 1][cols - 2] = grid[rows - 2][cols - 1] = '.'
+    grid[0][0], grid[rows - 1][cols - 1] = 's', 'g'
+    return [''.join(row) for row in grid]
+
+
+def arenas(count, seed):
+    '''
+    Solvable random arenas with their optimal cost
+    '''
+    found = []
+    for index in range(seed * 1000, seed * 1000 + 100):
+        arena = random_arena(index)
+        cost = maze.bfs(arena)[1]
+        if cost >= 0:
+            found.append((arena, cost))
+        if len(found) == count:
+            return found
+    raise AssertionError("Too few solvable arenas")
+
+
+def check_path(arena, result):
+    '''
+    Checks that the cells marked in the solved arena join s to g through open cells within the reported cost
+    '''
+    solved, cost = result[0], result[1]
+    marked = {(i, j) for i, row in enumerate(solved) for j, char in enumerate(row) if char in "*sg"}
+    state = maze.MazeState(arena)
+    assert all(maze.is_open(arena, position) for position in marked)
+    assert len(marked) <= cost + 1
+
+    reached, queue = {state.start}, collections.deque([state.start])
+    while queue:
+        position = queue.popleft()
+        for neighbor in maze.grid_neighbors(position):
+            if neighbor in marked and neighbor not in reached:
+                reached.add(neighbor)
+                queue.append(neighbor)
+    assert state.goal in reached
+
+
+def test_contraction_hierarchy_matches_bfs():
+    for arena, optimal in arenas(5, 1):
+        hierarchy = maze.ContractionHierarchy(arena)
+        result = maze.ch(arena, hierarchy)
+        assert result[1] == optimal
+        check_path(arena, result)
+
+
+def test_contraction_hierarchy_saved_by_the_script_loads_in_an_importer(tmp_path):
+    arena, optimal = arenas(1, 6)[0]
+    map_file, hierarchy_file = tmp_path / "arena.txt", tmp_path / "arena.ch"
+    map_file.write_text("\n".join(arena))
+    subprocess.run([sys.executable, maze.__file__, "-ch", "-chfile", str(hierarchy_file), "-m", str(map_file)],
+                   check=True, stdout=subprocess.DEVNULL)
+
+    hierarchy = maze.ContractionHierarchy.load(str(hierarchy_file))
+    assert hierarchy.arena_key == maze.arena_key(arena)
+    result = maze.ch(arena, hierarchy)
+    assert result[1] == optimal
+    check_path(arena, result)
+
+
+def test_hpa_is_valid_and_no_cheaper_than_bfs():
+    for arena, optimal in arenas(5, 2):
+        result = maze.hpa(arena)
+        assert result[1] >= optimal
+        check_path(arena, result)
+
+
+def test_sma_matches_bfs():
+    for arena, optimal in arenas(5, 3):
+        for max_nodes in (300, 10000):
+            result = maze.sma(arena, max_nodes)
+            assert result[1] == optimal
+            assert result[3] <= max_nodes
+            check_path(arena, result)
+
+    # Memory tight enough that cheaper paths turn up after dearer ones to the same cell were stored
+    for seed, max_nodes in ((36, 60), (86, 60), (109, 60), (129, 100)):
+        arena = random_arena(seed, 20, 25, 0.3)
+        result = maze.sma(arena, max_nodes)
+        assert result[1] == maze.bfs(arena)[1]
+        check_path(arena, result)
+
+    # Unreachable goals, with budgets below the reachable area that keep SMA* regenerating nodes for ever
+    for seed in (0, 41):
+        arena = random_arena(seed, 29, 22, 0.35)
+        assert maze.bfs(arena)[1] == -1
+        assert maze.sma(arena, 80) == ([], -1, -1, -1, -1, -1, -1)
+
+
+def test_beam_is_valid_and_no_cheaper_than_bfs():
+    for arena, optimal in arenas(5, 4):
+        assert maze.beam(arena, 1000)[1] == optimal
+        for width in (3, 20):
+            result = maze.beam(arena, width)
+            if result[1] >= 0:
+                assert result[1] >= optimal
+                check_path(arena, result)
+
+
+def test_frontier_bfs_matches_bfs():
+    for arena, optimal in arenas(5, 5):
+        result = maze.bfs_frontier(arena)
+        assert result[1] == optimal
+        check_path(arena, result)
+        assert maze.bfs_frontier(arena, 2) == ([], -1, -1, -1, -1, -1, -1)
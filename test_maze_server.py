@@ -0,0 +1,118 @@
+"""
+Tests of the maze path planning server, run in process on a Unix socket in a temporary directory.
+
+Run with:
+$python3 -m pytest test_maze_server.py
+"""
+import asyncio
+import json
+import os
+
+import pytest
+
+import maze_server
+from maze_server import MazeServer, with_endpoints, run_query
+
+ARENA = ["s.........",
+         ".oooooooo.",
+         ".o......o.",
+         ".o.oooo.o.",
+         "...o..o...",
+         "ooo...ooo.",
+         ".........g"]
+
+
+@pytest.fixture
+def map_file(tmp_path):
+    path = tmp_path / "arena.txt"
+    path.write_text("\n".join(ARENA))
+    return str(path)
+
+
+def run(coroutine_function):
+    '''
+    Runs coroutine_function with a fresh two worker server and shuts the server down afterwards
+    '''
+    server = MazeServer(workers=2)
+    try:
+        return asyncio.run(coroutine_function(server))
+    finally:
+        server.executor.shutdown()
+
+
+def test_with_endpoints_rejects_cells_outside_the_map():
+    assert with_endpoints(ARENA, (2, 2), None)[2][2] == "s"
+    for position in ((-1, 0), (0, -1), (7, 0), (0, 10), (1,)):
+        with pytest.raises(ValueError):
+            with_endpoints(ARENA, position, None)
+        with pytest.raises(ValueError):
+            with_endpoints(ARENA, None, position)
+
+
+def test_endpoints_on_obstacles_are_rejected_and_do_not_leak_into_shared_planners(tmp_path):
+    path = tmp_path / "walled.txt"
+    path.write_text("s.o..\n..o..\n..o.g")
+    filename, mtime = str(path), os.stat(path).st_mtime_ns
+    for algorithm in ("hpa", "ch"):
+        with pytest.raises(ValueError):
+            run_query(filename, mtime, (1, 2), None, algorithm)
+        with pytest.raises(ValueError):
+            run_query(filename, mtime, None, (0, 2), algorithm)
+
+        # A custom start on an open cell must not change what later requests on the same map see
+        assert run_query(filename, mtime, None, (2, 1), algorithm)["cost"] == 3
+        assert run_query(filename, mtime, None, None, algorithm)["cost"] == -1
+
+
+def test_cached_arenas_and_planners_of_older_map_versions_are_dropped(map_file):
+    # Each new modification time stands for an edit of the file
+    for version in range(3):
+        mtime = os.stat(map_file).st_mtime_ns + version
+        assert run_query(map_file, mtime, None, None, "hpa")["cost"] == 15
+        assert [key for key in maze_server.ARENAS if key[0] == map_file] == [(map_file, mtime)]
+        assert [key for key in maze_server.PLANNERS if key[0] == map_file] == [(map_file, mtime)]
+
+
+def test_cancelled_client_does_not_cancel_coalesced_search(map_file):
+    async def scenario(server):
+        request = {"map": map_file, "algorithm": "bfs"}
+        first = asyncio.ensure_future(server.solve(request))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(server.solve(request))
+        await asyncio.sleep(0)
+        first.cancel()
+        result = await second
+        assert first.cancelled()
+        assert server.counters["searches"] == 1 and server.counters["coalesced"] == 1
+        assert not server.in_flight and len(server.cache) == 1
+        return result
+
+    assert run(scenario)["cost"] == 15
+
+
+def test_errors_answer_their_own_request(map_file, tmp_path):
+    socket_path = str(tmp_path / "maze.sock")
+
+    async def scenario(server):
+        serving = asyncio.ensure_future(server.serve(socket_path))
+        while not (tmp_path / "maze.sock").exists():
+            await asyncio.sleep(0.01)
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        lines = ["not json",
+                 json.dumps({"id": 1, "map": map_file, "start": [-1, 0]}),
+                 "[1, 2]",
+                 json.dumps({"id": 2, "map": map_file, "goal": [0, 3]})]
+        responses = []
+        for line in lines:
+            writer.write((line + "\n").encode())
+            await writer.drain()
+            responses.append(json.loads(await reader.readline()))
+        writer.close()
+        serving.cancel()
+        return responses
+
+    responses = run(scenario)
+    assert "error" in responses[0] and "id" not in responses[0]
+    assert "error" in responses[1] and responses[1]["id"] == 1
+    assert "error" in responses[2] and "id" not in responses[2]
+    assert responses[3]["id"] == 2 and responses[3]["cost"] == 3